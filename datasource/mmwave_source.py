@@ -45,6 +45,7 @@ class MMWaveSource:
 
         self._bin_files = self._scan_bins()
         self._bin_idx: int = 0
+        self._serial: int = 0
 
         self._lock = threading.Lock()
 
@@ -57,6 +58,7 @@ class MMWaveSource:
         return files
 
     def get_one_mmwave_file(self):
+        """return the next file and its serial number of serving (files are taken under the lock for concurrent requests)"""
         with self._lock:
             if not self._bin_files:
                 raise HTTPException(status_code=404, detail="No mmwave files found in data_dir")
@@ -64,13 +66,18 @@ class MMWaveSource:
                 if self.play_mode == 'cycle':
                     self._bin_idx = 0
                 else:
-                    return
-        return self._bin_files[self._bin_idx]
+                    raise HTTPException(status_code=404, detail="No more mmwave files to play")
+            file_name = self._bin_files[self._bin_idx]
+            serial = self._serial
+            self._bin_idx += 1
+            self._serial += 1
+        return file_name, serial
 
     def get_source_file(self, backtask: BackgroundTasks):
-        file_name = self.get_one_mmwave_file()
-        self._bin_idx += 1
-        return FileResponse(path=file_name, filename=file_name, media_type='application/octet-stream')
+        file_name, serial = self.get_one_mmwave_file()
+        # serial orders the files of concurrent requests as they are served
+        return FileResponse(path=file_name, filename=file_name, media_type='application/octet-stream',
+                            headers={'X-Frame-Serial': str(serial)})
 
 
 @app.post("/admin/add_source")
@@ -1,6 +1,9 @@
 import os
 import cv2
 import json
+import tempfile
+from collections import OrderedDict
+import numpy as np
 import uvicorn
 import argparse
 import socket
@@ -12,7 +15,7 @@ from pydantic import BaseModel
 
 from fastapi import FastAPI, Form, BackgroundTasks
 from fastapi.routing import APIRouter
-from starlette.responses import JSONResponse, FileResponse
+from starlette.responses import JSONResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from core.lib.common import FileOps, LOGGER, Context, NameMaintainer
@@ -31,11 +34,137 @@ class SourceRequest(BaseModel):
     play_mode: str
 
 
+class FrameStore:
+    """
+    Decoded frames of a frame directory (`{index}.jpg`).
+    Frames are decoded from their jpg files on every read, unless preloaded by `preload_mode`:
+      - 'memory': decoded frames are kept in memory
+      - 'mmap': decoded frames are written once to a raw frame file that is memory-mapped
+        (pages are shared with the OS page cache instead of being held by the process)
+    Frames are preloaded in background, frames not preloaded yet are decoded from their files.
+    """
+
+    PRELOAD_MODES = ('none', 'memory', 'mmap')
+
+    def __init__(self, data_dir, frame_count, preload_mode='none'):
+        assert preload_mode in self.PRELOAD_MODES, \
+            f'Preload mode "{preload_mode}" not supported, supported modes: {self.PRELOAD_MODES}'
+        self.data_dir = data_dir
+        self.frame_count = frame_count
+        self.preload_mode = preload_mode
+
+        self.frames = [None] * frame_count
+        self.raw_frames = None
+        self.preloaded_count = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.preload_mode != 'none' and self.frame_count > 0:
+            threading.Thread(target=self.preload, daemon=True).start()
+
+    def read(self, index):
+        return cv2.imread(os.path.join(self.data_dir, f'{index}.jpg'))
+
+    def get(self, index):
+        if index < self.preloaded_count:
+            self.hits += 1
+            return self.frames[index] if self.raw_frames is None else self.raw_frames[index]
+        self.misses += 1
+        return self.read(index)
+
+    def preload(self):
+        try:
+            if self.preload_mode == 'memory':
+                for index in range(self.frame_count):
+                    self.frames[index] = self.read(index)
+                    self.preloaded_count = index + 1
+            else:
+                self.preload_mmap()
+            LOGGER.info(f'[Frame Store] Preloaded {self.preloaded_count} frames of {self.data_dir} '
+                        f'in {self.preload_mode} mode')
+        except Exception as e:
+            LOGGER.warning(f'[Frame Store] Preload frames of {self.data_dir} failed: {str(e)}')
+            LOGGER.exception(e)
+
+    def preload_mmap(self):
+        first_frame = self.read(0)
+        shape = (self.frame_count,) + first_frame.shape
+        raw_file = tempfile.NamedTemporaryFile(prefix='frames-', suffix='.npy', delete=False)
+        raw_file.close()
+        raw_frames = np.lib.format.open_memmap(raw_file.name, mode='w+', dtype=first_frame.dtype, shape=shape)
+        for index in range(self.frame_count):
+            frame = first_frame if index == 0 else self.read(index)
+            if frame.shape != first_frame.shape:
+                raise ValueError(f'Frame {index} of shape {frame.shape} differs from '
+                                 f'the first frame of shape {first_frame.shape}')
+            raw_frames[index] = frame
+        raw_frames.flush()
+        # reopen read-only, the raw file is removed once unmapped
+        self.raw_frames = np.load(raw_file.name, mmap_mode='r')
+        os.remove(raw_file.name)
+        self.preloaded_count = self.frame_count
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {'preload_mode': self.preload_mode, 'preloaded': self.preloaded_count,
+                'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+
+class SegmentCache:
+    """
+    LRU cache of encoded segments within `max_bytes` (0 disables the cache).
+    A segment is keyed by the frames it holds and everything its processing and encoding depend on.
+    """
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.segments = OrderedDict()
+        self.used_bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def is_enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key):
+        with self.lock:
+            segment = self.segments.get(key)
+            if segment is None:
+                self.misses += 1
+                return None
+            self.segments.move_to_end(key)
+            self.hits += 1
+            return segment
+
+    def put(self, key, segment):
+        if len(segment) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.segments:
+                return
+            self.segments[key] = segment
+            self.used_bytes += len(segment)
+            while self.used_bytes > self.max_bytes:
+                _, evicted = self.segments.popitem(last=False)
+                self.used_bytes -= len(evicted)
+
+    def get_stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {'segments': len(self.segments), 'bytes': self.used_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+
 class VideoSource:
     def __init__(self, data_root, play_mode):
         self.router = APIRouter()
         self.router.add_api_route('/source', self.get_source_data, methods=['GET'])
         self.router.add_api_route('/file', self.get_source_file, methods=['GET'])
+        self.router.add_api_route('/segment', self.get_source_segment, methods=['GET'])
+        self.router.add_api_route('/cache', self.get_cache_stats, methods=['GET'])
 
         self.data_root = data_root
         self.data_dir = os.path.join(self.data_root, 'frames')
@@ -46,6 +175,11 @@ class VideoSource:
         self.is_end = False
         self.frame_max_count = len(os.listdir(self.data_dir))
 
+        self.frame_store = FrameStore(self.data_dir, self.frame_max_count,
+                                      preload_mode=Context.get_parameter('VIDEO_PRELOAD_MODE', 'none'))
+        self.segment_cache = SegmentCache(
+            max_bytes=int(float(Context.get_parameter('VIDEO_SEGMENT_CACHE_MB', 0)) * 1024 * 1024))
+
         self.file_name = None
 
         self.source_id = None
@@ -59,8 +193,10 @@ class VideoSource:
 
         self.file_suffix = 'mp4'
 
+        self.segment_lock = threading.Lock()
+
     def get_one_frame(self):
-        frame = cv2.imread(os.path.join(self.data_dir, f'{self.frame_count}.jpg'))
+        frame = self.frame_store.get(self.frame_count)
         self.frame_count += 1
         if self.frame_count >= self.frame_max_count:
             if self.play_mode == 'non-cycle':
@@ -68,15 +204,35 @@ class VideoSource:
                 LOGGER.info('A video play cycle ends. Video play ends in non-cycle mode.')
             else:
                 LOGGER.info('A video play cycle ends. Replay video in cycle mode.')
+            LOGGER.info(f'Cache stats: {self.get_cache_stats()}')
         self.frame_count %= self.frame_max_count
         return frame
 
     def get_source_data(self, data: str = Form(...)):
-
-        if self.is_end:
+        frames_index = self.prepare_segment(json.loads(data))
+        if frames_index is None:
             return []
+        return JSONResponse(frames_index)
 
-        data = json.loads(data)
+    def get_source_segment(self, data: str = Form(...)):
+        """
+        metadata (frames index, in the `X-Segment-Meta` header) and body of the next segment in a single response,
+        combining `/source` and `/file` (an empty frames index and body once the video ends)
+        """
+        with self.segment_lock:
+            frames_index = self.prepare_segment(json.loads(data))
+            if frames_index is None:
+                return Response(content=b'', media_type='application/octet-stream', headers={'X-Segment-Meta': '[]'})
+            with open(self.file_name, 'rb') as f:
+                segment = f.read()
+            FileOps.remove_file(self.file_name)
+        return Response(content=segment, media_type='application/octet-stream',
+                        headers={'X-Segment-Meta': json.dumps(frames_index)})
+
+    def prepare_segment(self, data):
+        """encode the next segment to `self.file_name`, return its frames index (None once the video ends)"""
+        if self.is_end:
+            return None
 
         self.source_id = data['source_id']
         self.task_id = data['task_id']
@@ -98,22 +254,53 @@ class VideoSource:
 
         frames_index = []
         frames_buffer = []
+        frames_source_index = []
         while len(frames_buffer) < buffer_size:
+            source_index = self.frame_count
             frame = self.get_one_frame()
             if self.frame_filter(self, frame):
                 frames_buffer.append(frame)
                 frames_index.append(self.frame_count)
+                frames_source_index.append(source_index)
+
+        self.file_name = NameMaintainer.get_task_data_file_name(self.source_id, self.task_id,
+                                                                file_suffix=self.file_suffix)
+
+        segment_key = self.get_segment_key(frames_source_index, frame_process_name, frame_compress_name) \
+            if self.segment_cache.is_enabled() else None
+        segment = self.segment_cache.get(segment_key) if segment_key else None
+        if segment is not None:
+            with open(self.file_name, 'wb') as f:
+                f.write(segment)
+            return frames_index
 
         frames_buffer = [
             self.frame_process(self, frame, self.raw_meta_data['resolution'], self.meta_data['resolution'])
             for frame in frames_buffer
         ]
 
-        self.file_name = NameMaintainer.get_task_data_file_name(self.source_id, self.task_id,
-                                                                file_suffix=self.file_suffix)
         self.frame_compress(self, frames_buffer, self.file_name)
 
-        return JSONResponse(frames_index)
+        if segment_key:
+            with open(self.file_name, 'rb') as f:
+                self.segment_cache.put(segment_key, f.read())
+
+        return frames_index
+
+    def get_segment_key(self, frames_source_index, frame_process_name, frame_compress_name):
+        """
+        segment key of the frames (start frame, length and frame offsets if not consecutive) and of the decisions
+        processing and encoding depend on (resolution, fps, encoding, ...)
+        """
+        start = frames_source_index[0]
+        offsets = tuple((index - start) % self.frame_max_count for index in frames_source_index)
+        if offsets == tuple(range(len(offsets))):
+            offsets = None
+        return (start, len(frames_source_index), offsets, self.raw_meta_data['resolution'],
+                json.dumps(self.meta_data, sort_keys=True), frame_process_name, frame_compress_name)
+
+    def get_cache_stats(self):
+        return {'frames': self.frame_store.get_stats(), 'segments': self.segment_cache.get_stats()}
 
     def get_source_file(self, backtask: BackgroundTasks):
         return FileResponse(path=self.file_name, filename=self.file_name, media_type='application/octet-stream',
@@ -1,3 +1,4 @@
 from .imu_trajectory_sensing import IMUTrajectorySensing as IMUTracker
+from .imu_trajectory_sensing import IMUTrajectoryStream as IMUTrackerStream
 
-__all__ = ["IMUTracker"]
+__all__ = ["IMUTracker", "IMUTrackerStream"]
@@ -1,7 +1,12 @@
 import numpy as np
-from scipy.integrate import cumtrapz
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy.signal import find_peaks
 
+try:
+    from scipy.integrate import cumulative_trapezoid
+except ImportError:  # scipy < 1.6
+    from scipy.integrate import cumtrapz as cumulative_trapezoid
+
 
 class IMUTrajectorySensing:
     def __init__(self):
@@ -40,12 +45,8 @@ class IMUTrajectorySensing:
         id = np.arange(wlen / 2, wlen / 2 + (fn - 1) * inc + 1, inc)
         id = id - 1
         frametime = time[id.astype(int)]
-        En = np.zeros(fn)
-
-        for i in range(fn):
-            u = X[:, i]
-            u2 = u * u
-            En[i] = np.sum(u2)
+        # short-time energy of all frames at once
+        En = np.einsum('ij,ij->j', X, X)
         locs, pks = find_peaks(En, height=max(En) / 20, distance=15)
         pks = pks['peak_heights']
         # initialize startend_locs
@@ -75,20 +76,18 @@ class IMUTrajectorySensing:
         return start_id, end_id
 
     def enframe(self, x, win, inc):
-        nx = len(x)
         nwin = len(win)
         if nwin == 1:
-            length = win
+            length = int(np.ravel(win)[0])
         else:
             length = nwin
-        nf = int(np.fix((nx - length + inc) / inc))
-        f = np.zeros((nf, length))
-        indf = inc * np.arange(nf).reshape(-1, 1)
-        inds = np.arange(1, length + 1)
-        f[:] = x[indf + inds - 1]  # 对数据分帧
+        # frames are strided views over the signal (one frame every `inc` samples), copied once when windowed
+        f = sliding_window_view(np.asarray(x, dtype=float), length)[::inc]  # 对数据分帧
         if nwin > 1:
             w = win.ravel()
             f = f * w[np.newaxis, :]
+        else:
+            f = f.copy()
         return f
 
     def getPCA4(self, data, R):
@@ -115,26 +114,44 @@ class IMUTrajectorySensing:
         - C: Rotation matrices for each time step.
         """
         sample_num = lpms_gyro.shape[0]
-        I = np.eye(3)
 
         # Initialize rotation matrix
         C = np.zeros((3, 3, sample_num))
         C[:, :, 0] = R
 
+        A = self.getIncrementalRotation(lpms_gyro[1:], np.diff(lpms_time))
         for i in range(1, sample_num):
-            w = lpms_gyro[i, :]
-            wx, wy, wz = w
-            t = lpms_time[i] - lpms_time[i - 1]
-            B = np.array([[0, -wz * t, wy * t],
-                          [wz * t, 0, -wx * t],
-                          [-wy * t, wx * t, 0]])
-            delta = np.linalg.norm(w * t)
-            Ai = I + np.sin(delta) / delta * B + (1 - np.cos(delta)) / (delta ** 2) * np.dot(B, B)
-            Ci = np.dot(C[:, :, i - 1], Ai)
-            C[:, :, i] = Ci
+            C[:, :, i] = C[:, :, i - 1] @ A[i - 1]
 
         return C
 
+    @staticmethod
+    def getIncrementalRotation(gyro, dt):
+        """
+        Rotation of each sample interval (Rodrigues formula), computed for all samples at once.
+
+        Parameters:
+        - gyro: Gyroscope data (angular velocity) at the end of each interval, shape (n, 3).
+        - dt: Duration of each interval, shape (n,).
+
+        Returns:
+        - A: Rotation matrices of each interval, shape (n, 3, 3).
+        """
+        theta = gyro * np.asarray(dt, dtype=float)[:, np.newaxis]
+        tx, ty, tz = theta[:, 0], theta[:, 1], theta[:, 2]
+        zero = np.zeros_like(tx)
+        B = np.stack([np.stack([zero, -tz, ty], axis=-1),
+                      np.stack([tz, zero, -tx], axis=-1),
+                      np.stack([-ty, tx, zero], axis=-1)], axis=-2)
+        delta = np.linalg.norm(theta, axis=1)
+
+        # without rotation the increment is the identity (limit of the coefficients at delta -> 0)
+        moving = delta > 0
+        safe_delta = np.where(moving, delta, 1)
+        k1 = np.where(moving, np.sin(safe_delta) / safe_delta, 1)[:, np.newaxis, np.newaxis]
+        k2 = np.where(moving, (1 - np.cos(safe_delta)) / safe_delta ** 2, 0.5)[:, np.newaxis, np.newaxis]
+        return np.eye(3) + k1 * B + k2 * (B @ B)
+
     def getProjLA(self, watch_linearacc, C):
         """
         Rotate linear acceleration to the global frame.
@@ -147,20 +164,8 @@ class IMUTrajectorySensing:
         - linearacc_proj: Projected linear acceleration in the global frame.
         """
 
-        linearacc_proj = np.zeros_like(watch_linearacc)
-        sample_num = watch_linearacc.shape[0]
-
-        for i in range(sample_num):
-            # Get the rotation matrix from local to global frame
-            Ci = C[:, :, i]
-
-            # Get local linear acceleration
-            linearacci = watch_linearacc[i, :]
-
-            # Project current linear acceleration to global frame
-            linearacc_proj[i, :] = np.dot(Ci, linearacci)
-
-        return linearacc_proj
+        # Project linear acceleration of every time step to global frame
+        return np.einsum('ijn,nj->ni', C, watch_linearacc)
 
     def getDis(self, watch_time, linearacc_proj):
         """
@@ -177,9 +182,7 @@ class IMUTrajectorySensing:
         watch_time = watch_time - watch_time[0]
 
         # Raw velocity
-        velocity = np.copy(linearacc_proj)
-        for i in range(3):
-            velocity[:, i] = cumtrapz(linearacc_proj[:, i], watch_time[:], initial=0)
+        velocity = cumulative_trapezoid(linearacc_proj, watch_time, axis=0, initial=0)
 
         # Calibrated velocity
         v_offset = velocity[-1, :]
@@ -188,8 +191,90 @@ class IMUTrajectorySensing:
         v_calibrate = velocity - v_subtract
 
         # Displacement
-        displacement = np.copy(v_calibrate)
-        for i in range(3):
-            displacement[:, i] = cumtrapz(v_calibrate[:, i], watch_time[:], initial=0)
+        displacement = cumulative_trapezoid(v_calibrate, watch_time, axis=0, initial=0)
 
         return displacement
+
+
+class IMUTrajectoryStream:
+    """
+    Incremental trajectory sensing of a continuous IMU stream fed in chunks,
+    with the sample layout of `IMUTrajectorySensing` (time, gyro xyz, linear acceleration xyz).
+
+    Orientation, raw velocity and raw displacement are integrated once for each new sample and kept across calls.
+    The velocity calibration of the batch mode (drift removed linearly in time up to the latest sample) is applied
+    in closed form, so `update` returns the same displacement as the batch mode on all samples received so far.
+    """
+
+    def __init__(self, R=None):
+        self.R = np.eye(3) if R is None else np.asarray(R, dtype=float)
+        self.reset()
+
+    def reset(self):
+        self.start_time = None
+        self.last_time = None
+        self.last_rotation = self.R
+        self.last_acc = np.zeros(3)
+        self.last_velocity = np.zeros(3)
+        self.last_displacement = np.zeros(3)
+
+        # relative time and raw (uncalibrated) displacement of every received sample
+        self.times = []
+        self.raw_displacements = []
+
+    def update(self, data):
+        data = np.asarray(data, dtype=float).reshape(-1, 7)
+        if data.shape[0] > 0:
+            self.integrate(data[:, 0], data[:, 1:4], data[:, 4:7])
+        return self.get_displacement().tolist()
+
+    def integrate(self, lpms_time, lpms_gyro, lpms_linearacc):
+        if self.start_time is None:
+            # the first sample is in the initial orientation at rest
+            self.start_time = lpms_time[0]
+            self.last_time = 0.0
+            self.last_acc = self.R @ lpms_linearacc[0]
+            self.times.append(np.zeros(1))
+            self.raw_displacements.append(np.zeros((1, 3)))
+            lpms_time, lpms_gyro, lpms_linearacc = lpms_time[1:], lpms_gyro[1:], lpms_linearacc[1:]
+            if lpms_time.size == 0:
+                return
+
+        watch_time = lpms_time - self.start_time
+        dt = np.diff(watch_time, prepend=self.last_time)
+
+        # orientation and projected linear acceleration
+        A = IMUTrajectorySensing.getIncrementalRotation(lpms_gyro, dt)
+        C = np.empty_like(A)
+        rotation = self.last_rotation
+        for i in range(A.shape[0]):
+            rotation = rotation @ A[i]
+            C[i] = rotation
+        linearacc_proj = np.einsum('nij,nj->ni', C, lpms_linearacc)
+
+        # trapezoidal integration continued from the last sample
+        acc = np.vstack([self.last_acc, linearacc_proj])
+        velocity = self.last_velocity + np.cumsum((acc[1:] + acc[:-1]) / 2 * dt[:, np.newaxis], axis=0)
+        vel = np.vstack([self.last_velocity, velocity])
+        displacement = self.last_displacement + np.cumsum((vel[1:] + vel[:-1]) / 2 * dt[:, np.newaxis], axis=0)
+
+        self.last_time = watch_time[-1]
+        self.last_rotation = rotation
+        self.last_acc = linearacc_proj[-1]
+        self.last_velocity = velocity[-1]
+        self.last_displacement = displacement[-1]
+        self.times.append(watch_time)
+        self.raw_displacements.append(displacement)
+
+    def get_displacement(self):
+        if not self.times:
+            return np.zeros((0, 3))
+        watch_time = np.concatenate(self.times)
+        raw_displacement = np.concatenate(self.raw_displacements)
+        self.times, self.raw_displacements = [watch_time], [raw_displacement]
+
+        if self.last_time <= 0:
+            return raw_displacement
+        # the velocity drift v_end * t / t_end removed by the batch calibration integrates to v_end / t_end * t^2 / 2
+        v_offset_unit = self.last_velocity / self.last_time
+        return raw_displacement - np.outer(watch_time ** 2 / 2, v_offset_unit)
@@ -1,74 +1,104 @@
+import os
+
 import numpy as np
 from .mmwave_config import MMWaveConfig
 
 
 class FrameIter:
-    def __init__(self, c: MMWaveConfig, files: 'list[str]'):
+    """
+    Frames of raw ADC data split over consecutive bin files.
+
+    Frames are indexed over the files, which are memory-mapped by windows of `WINDOW_BYTES`, so frames are decoded
+    lazily (one at a time when iterating, or randomly accessed with `frame_iter[index]`) and a frame may span
+    any number of files.
+    A file may also be given as (path, byte offset, byte size) of its data inside another file,
+    eg: a member of an uncompressed container, which is then read in place.
+    Trailing data not filling a whole frame is ignored.
+    """
+
+    WINDOW_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, c: MMWaveConfig, files: 'list[str | tuple[str, int, int]]'):
         self.cfg = c
         self.frameSize = calcFrameSize_2Byte(c)
-        self.currentFp = None
 
-        self.files = files
-        self.fileIdx = 0
-        self.bufp = 0
-        self.buf = np.array([], dtype=np.uint16)
+        # path, byte offset of the data in the path and byte size of the data of each file
+        self.files = [(file, 0, os.path.getsize(file)) if isinstance(file, str) else tuple(file) for file in files]
+        # global offset (in 2-byte elements) of the first element of each file, and the total size at the end
+        sizes = [size // 2 for _, _, size in self.files]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+        self.numFrame = int(self.offsets[-1] // self.frameSize)
 
-    def _nextFile(self):
-        if len(self.files) == self.fileIdx:
-            raise StopIteration
+        # currently mapped window: (file index, offset in the file, mapped data)
+        self.windowSize = max(self.WINDOW_BYTES // 2, self.frameSize)
+        self.window = (None, 0, np.array([], dtype=np.uint16))
 
-        self.bufp = 0
-        self.buf = np.fromfile(
-            file=self.files[self.fileIdx],
-            dtype=np.uint16
-        )
+        self.frameIdx = 0
 
-        self.fileIdx += 1
+    def __len__(self):
+        return self.numFrame
 
     def __iter__(self):
-        if self.currentFp is not None:
-            self.currentFp.close()
-
-        self.fileIdx = 0
-        self._nextFile()
-
+        self.frameIdx = 0
         return self
 
     def __next__(self):
-        bufp = self.bufp
-        frameSize = self.frameSize
-        c = self.cfg
-
-        ret = self.buf[bufp: bufp + frameSize]
-
-        if ret.size != frameSize:
-            self._nextFile()
-            ret = np.concatenate([ret, self.buf[:frameSize - ret.size]])
-
-            # the next file does not contain enough data
-            if ret.size != frameSize:
-                raise StopIteration
-
-            self.bufp = frameSize - ret.size
-        else:
-            self.bufp += frameSize
-
-        if self.cfg.calc_num_rx() == 1:
-            ret = ret.reshape([-1, 2])[:, 0].reshape([-1])
-
-        tmp = ret.reshape(-1, 4).astype(np.int16)
-
-        # get complex
-        ret = np.zeros([ret.size // 2], dtype=np.complex64)
-        ret += tmp[:, 0:2].reshape(-1)
-        ret += tmp[:, 2:4].reshape(-1).astype(np.complex64) * 1j
-
-        # get normal form
-        ret = ret.reshape([c.numChirpPerFramePerTx, c.calc_num_tx(), c.calc_num_rx(), c.numSamplePerChirp])
-        ret = ret.transpose([1, 2, 0, 3])
-
+        if self.frameIdx >= self.numFrame:
+            raise StopIteration
+        ret = self[self.frameIdx]
+        self.frameIdx += 1
         return ret
 
+    def __getitem__(self, index: int) -> np.ndarray:
+        if index < 0:
+            index += self.numFrame
+        if not 0 <= index < self.numFrame:
+            raise IndexError(f'Frame index {index} out of range of {self.numFrame} frames')
+        return decodeFrame(self.cfg, self._read(index * self.frameSize, self.frameSize))
+
+    def _read(self, start: int, size: int) -> np.ndarray:
+        # files overlapping [start, start + size)
+        first = int(np.searchsorted(self.offsets, start, side='right')) - 1
+        last = int(np.searchsorted(self.offsets, start + size, side='left')) - 1
+
+        pieces = []
+        for fileIdx in range(first, last + 1):
+            file_start = int(max(start - self.offsets[fileIdx], 0))
+            file_end = int(min(start + size, self.offsets[fileIdx + 1]) - self.offsets[fileIdx])
+            if file_end > file_start:
+                pieces.append(self._read_file(fileIdx, file_start, file_end))
+        return pieces[0] if len(pieces) == 1 else np.concatenate(pieces)
+
+    def _read_file(self, fileIdx: int, start: int, end: int) -> np.ndarray:
+        # map a bounded window of the file at a time, so that resident memory does not grow with the file size
+        window_idx, window_start, window = self.window
+        if window_idx != fileIdx or start < window_start or end > window_start + window.size:
+            file_size = int(self.offsets[fileIdx + 1] - self.offsets[fileIdx])
+            window_start = start
+            path, data_offset, _ = self.files[fileIdx]
+            window = np.memmap(path, dtype=np.uint16, mode='r', offset=data_offset + start * 2,
+                               shape=(min(max(self.windowSize, end - start), file_size - start),)).view(np.ndarray)
+            self.window = (fileIdx, window_start, window)
+        return window[start - window_start: end - window_start]
+
+
+def decodeFrame(c: MMWaveConfig, raw: np.ndarray) -> np.ndarray:
+    if c.calc_num_rx() == 1:
+        raw = raw.reshape([-1, 2])[:, 0].reshape([-1])
+
+    tmp = raw.reshape(-1, 4).astype(np.int16)
+
+    # get complex
+    ret = np.zeros([raw.size // 2], dtype=np.complex64)
+    ret += tmp[:, 0:2].reshape(-1)
+    ret += tmp[:, 2:4].reshape(-1).astype(np.complex64) * 1j
+
+    # get normal form
+    ret = ret.reshape([c.numChirpPerFramePerTx, c.calc_num_tx(), c.calc_num_rx(), c.numSamplePerChirp])
+    ret = ret.transpose([1, 2, 0, 3])
+
+    return ret
+
 
 def calcFrameSize_2Byte(c: MMWaveConfig):
     # Complex IQ
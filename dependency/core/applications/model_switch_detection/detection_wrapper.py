@@ -61,8 +61,12 @@ class ModelSwitchDetection:
 
     def __init__(self, model_type: str, switch_type: str,
                  decision_interval: int,
-                 *args, **kwargs):
+                 *args, max_batch_size: int = 8, **kwargs):
         
+        # images of a call are inferred in batches of at most max_batch_size images,
+        # the model may only be switched between batches
+        self.max_batch_size = max(int(max_batch_size), 1)
+
         if model_type == 'yolo':
             YoloInference = _import_yolo_inference_module()
             self.detector = YoloInference(*args, **kwargs)
@@ -96,8 +100,8 @@ class ModelSwitchDetection:
 
         output = []
 
-        for image in images:
-            output.append(self.infer(image))
+        for start in range(0, len(images), self.max_batch_size):
+            output.extend(self.detector.infer_batch(images[start: start + self.max_batch_size]))
 
         return output
     
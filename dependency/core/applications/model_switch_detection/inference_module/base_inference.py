@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import List
 import numpy as np
 from .stats_manager import StatsManager, StatsEntry
 import cv2
@@ -55,6 +56,14 @@ class BaseInference(ABC):
         '''
         pass
 
+    def infer_batch(self, images: List[np.ndarray]):
+        '''
+        Do the inference on a batch of images with the same model.
+        Returns a list of (boxes, scores, labels) in the order of the images.
+        Detectors able to infer a whole batch at once should override it.
+        '''
+        return [self.infer(image) for image in images]
+
     @abstractmethod
     def get_current_model_index(self):
         '''
@@ -71,6 +80,13 @@ class BaseInference(ABC):
         result = http_request(url=queue_url, method=NetworkAPIMethod.PROCESSOR_QUEUE_LENGTH, timeout=5)
         return result
 
+    def prepare_update_batch_stats(self, images: List[np.ndarray], outputs, inference_latency):
+        '''
+        Prepare the stats of a batch for updating, inference_latency being the latency per image.
+        '''
+        for image, (boxes, scores, labels) in zip(images, outputs):
+            self.prepare_update_stats(image, boxes, scores, labels, inference_latency)
+
     @abstractmethod
     def prepare_update_stats(self, image: np.ndarray, boxes, scores, labels, inference_latency):
         '''
@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, List
+
+from core.lib.common import LOGGER
+
+
+class ModelRegistry:
+    '''
+    Lazily loaded candidate models, indexed as the configured model names.
+    - A model is loaded by `factory(index)` on its first use, loads of different models may run concurrently
+      and concurrent uses of a model being loaded wait for a single load.
+    - Loaded models are kept within `memory_budget` bytes (0 for no budget), evicting the least recently used ones.
+    - A model failing its first load is marked unavailable and keeps its index, so indices always match the configuration.
+      A failed reload of an evicted model is retried on the next use, as the model has loaded before.
+    - Latency of each model is seeded from the configuration (if given) and refined by EMA of the observed latencies.
+    '''
+
+    def __init__(self, model_names: List[str], factory: Callable, memory_budget: float = 0,
+                 latency: List[float] = None, ema_alpha: float = 0.2, size_fn: Callable = None):
+        self.model_names = list(model_names)
+        self.factory = factory
+        self.memory_budget = memory_budget
+        self.ema_alpha = ema_alpha
+        self.size_fn = size_fn or self.get_model_size
+
+        self.lock = threading.Lock()
+        self.load_locks = [threading.Lock() for _ in self.model_names]
+        # loaded models in least recently used order
+        self.models = OrderedDict()
+        self.sizes = {}
+        self.unavailable = {}
+        self.load_counts = [0] * len(self.model_names)
+
+        if latency is not None:
+            assert len(latency) == len(self.model_names), 'Model names and latencies do not match'
+        self.latency = [float(value) for value in latency] if latency is not None else [0.0] * len(self.model_names)
+        # unseeded latency is set by its first observation
+        self.latency_seeded = [latency is not None] * len(self.model_names)
+
+    def __len__(self):
+        return len(self.model_names)
+
+    def get(self, index: int, keep: Iterable[int] = ()):
+        '''
+        Get the model at index, loading it if needed.
+        Loading does not evict the models at indices in `keep` (e.g. the model in use).
+        Returns None if the model is unavailable (or its reload failed).
+        '''
+        with self.lock:
+            if index in self.models:
+                self.models.move_to_end(index)
+                return self.models[index]
+            if index in self.unavailable:
+                return None
+
+        with self.load_locks[index]:
+            with self.lock:
+                # loaded (or failed) while waiting for the load lock
+                if index in self.models:
+                    self.models.move_to_end(index)
+                    return self.models[index]
+                if index in self.unavailable:
+                    return None
+
+            try:
+                model = self.factory(index)
+                size = self.size_fn(model)
+            except Exception as e:
+                LOGGER.warning(f'[Model Registry] Load model {self.model_names[index]} failed: {str(e)}')
+                with self.lock:
+                    if self.load_counts[index] == 0:
+                        self.unavailable[index] = str(e)
+                return None
+
+            with self.lock:
+                self.models[index] = model
+                self.sizes[index] = size
+                self.load_counts[index] += 1
+                self._evict(keep={index, *keep})
+            return model
+
+    def is_available(self, index: int) -> bool:
+        with self.lock:
+            return index not in self.unavailable
+
+    def get_loaded_indices(self) -> List[int]:
+        '''indices of the loaded models, from the least to the most recently used'''
+        with self.lock:
+            return list(self.models)
+
+    def get_used_memory(self) -> float:
+        with self.lock:
+            return sum(self.sizes.values())
+
+    def update_latency(self, index: int, latency: float):
+        with self.lock:
+            if self.latency_seeded[index]:
+                self.latency[index] = self.ema_alpha * latency + (1 - self.ema_alpha) * self.latency[index]
+            else:
+                self.latency[index] = latency
+                self.latency_seeded[index] = True
+
+    def get_latencies(self) -> List[float]:
+        with self.lock:
+            return list(self.latency)
+
+    def _evict(self, keep: set):
+        if self.memory_budget <= 0:
+            return
+        used = sum(self.sizes.values())
+        for index in list(self.models):
+            if used <= self.memory_budget:
+                break
+            if index in keep:
+                continue
+            del self.models[index]
+            used -= self.sizes.pop(index)
+            LOGGER.info(f'[Model Registry] Evicted model {self.model_names[index]}')
+        if used > self.memory_budget:
+            LOGGER.warning(f'[Model Registry] Models {[self.model_names[index] for index in keep]} '
+                           f'({used} bytes) exceed the memory budget of {self.memory_budget} bytes')
+
+    @staticmethod
+    def get_model_size(model) -> int:
+        '''bytes of parameters and buffers of a torch module (0 for other models)'''
+        if not hasattr(model, 'parameters'):
+            return 0
+        size = sum(param.numel() * param.element_size() for param in model.parameters())
+        if hasattr(model, 'buffers'):
+            size += sum(buffer.numel() * buffer.element_size() for buffer in model.buffers())
+        return size
@@ -139,22 +139,36 @@ class OfaInference(BaseInference):
         return self.subnet_nums
     
     def infer(self, image: np.ndarray):
+        return self.infer_batch([image])[0]
 
-        processed_image = self.preprocess_image(image).to(torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu'))
-        start_time = time.perf_counter()
-        with torch.no_grad():
-            results = self.model(processed_image)[0]
-        inference_latency = time.perf_counter() - start_time
-        # 过滤低置信度的预测结果
-        mask = results['scores'] > 0.3
-        boxes = results['boxes'][mask].cpu().numpy().tolist()
-        labels = results['labels'][mask].cpu().numpy().tolist()
-        scores = results['scores'][mask].cpu().numpy().tolist()
+    def infer_batch(self, images: List[np.ndarray]):
+        '''
+        Do the inference on a batch of images in one forward pass of the current subnet.
+        The detector transform resizes the images and pads them to a common shape, and scales the boxes back to each image.
+        The model is locked for the whole batch, so that it is only switched between batches.
+        '''
+        device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+        processed_images = [self.preprocess_image(image)[0].to(device) for image in images]
+        with self.model_switch_lock:
+            start_time = time.perf_counter()
+            with torch.no_grad():
+                results = self.model(processed_images)
+            # latency per image of the batch
+            inference_latency = (time.perf_counter() - start_time) / len(images)
+
+        outputs = []
+        for result in results:
+            # 过滤低置信度的预测结果
+            mask = result['scores'] > 0.3
+            boxes = result['boxes'][mask].cpu().numpy().tolist()
+            labels = result['labels'][mask].cpu().numpy().tolist()
+            scores = result['scores'][mask].cpu().numpy().tolist()
+            outputs.append((boxes, scores, labels))
 
         # start a new thread to update stats
-        update_stats_thread = threading.Thread(target=self.prepare_update_stats, args=(image, boxes, scores, labels, inference_latency))
+        update_stats_thread = threading.Thread(target=self.prepare_update_batch_stats, args=(images, outputs, inference_latency))
         update_stats_thread.start()
-        return boxes, scores, labels
+        return outputs
     
     def prepare_update_stats(self, image: np.ndarray, boxes, scores, labels, inference_latency):
         '''
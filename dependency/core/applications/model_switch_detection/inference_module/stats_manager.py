@@ -1,5 +1,6 @@
-from dataclasses import dataclass
-from core.lib.common import Context
+from dataclasses import dataclass, astuple, fields
+from core.lib.common import Context, LOGGER
+import os
 import threading
 
 @dataclass
@@ -43,32 +44,139 @@ class StatsEntry:
             f"  Image Stats: brightness={self.brightness:.1f}, contrast={self.contrast:.1f}"
         )
     
+class StatsRing:
+    '''
+    Growable ring buffer of stats entries in arrival order.
+    Entries are indexed from the oldest (0) to the newest (len - 1) in O(1), without copying the buffer.
+    '''
+    def __init__(self, capacity: int = 256):
+        self.buffer = [None] * max(capacity, 1)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index: int) -> StatsEntry:
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError(f'Stats index {index} out of range of {self.size} entries')
+        return self.buffer[(self.head + index) % len(self.buffer)]
+
+    def append(self, entry: StatsEntry):
+        if self.size == len(self.buffer):
+            # double the capacity, unrolling the ring so that the oldest entry is first again
+            self.buffer = [self[i] for i in range(self.size)] + [None] * self.size
+            self.head = 0
+        self.buffer[(self.head + self.size) % len(self.buffer)] = entry
+        self.size += 1
+
+    def popleft(self) -> StatsEntry:
+        if not self.size:
+            raise IndexError('Pop from empty stats ring')
+        entry = self.buffer[self.head]
+        self.buffer[self.head] = None
+        self.head = (self.head + 1) % len(self.buffer)
+        self.size -= 1
+        return entry
+
+    def latest(self, nums: int) -> list:
+        '''the latest nums entries (at most len) from the oldest to the newest'''
+        return [self[i] for i in range(max(self.size - nums, 0), self.size)]
+
+    def bisect_right(self, timestamp: float) -> int:
+        '''index after the last entry whose timestamp is not larger than the given timestamp'''
+        left, right = 0, self.size
+        while left < right:
+            mid = (left + right) // 2
+            if self[mid].timestamp <= timestamp:
+                left = mid + 1
+            else:
+                right = mid
+        return left
+
+
+class StatsWriter:
+    '''
+    Append-only csv persistence of stats entries.
+    Rows are appended to the stats file as they come, which is rotated (to `<file>.1`) once it holds `max_rows` rows.
+    '''
+    HEADER = ','.join(field.name for field in fields(StatsEntry))
+
+    def __init__(self, file_name: str = 'stats.csv', max_rows: int = 10000):
+        self.file_name = file_name
+        self.file_path = None
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        self.file = None
+        self.rows = 0
+
+    def write(self, entry: StatsEntry):
+        row = ','.join(str(value) for value in astuple(entry)) + '\n'
+        with self.lock:
+            try:
+                if self.file is None or (self.max_rows > 0 and self.rows >= self.max_rows):
+                    self._open()
+                self.file.write(row)
+                self.file.flush()
+                self.rows += 1
+            except OSError as e:
+                LOGGER.warning(f'[Stats Manager] Write stats to {self.file_path} failed: {str(e)}')
+                self.close()
+
+    def _open(self):
+        if self.file_path is None:
+            self.file_path = Context.get_file_path(self.file_name)
+        self.close()
+        # rotate the full file (or the stats of a previous run)
+        if os.path.exists(self.file_path):
+            os.replace(self.file_path, f'{self.file_path}.1')
+        self.file = open(self.file_path, 'w')
+        self.file.write(self.HEADER + '\n')
+        self.rows = 0
+
+    def close(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+            self.file = None
+
+
 class StatsManager:
-    def __init__(self, time_window: int = 30.0):
-        # initialize a deque to store the stats
-        from collections import deque
-        self.stats = deque()
+    '''
+    Stats of the inferences in the latest time window (in seconds).
+    Updates and queries are thread safe. Stats are persisted to `stats.csv` (append-only, rotated every
+    `STATS_MAX_ROWS` rows) unless `STATS_PERSIST` is False.
+    '''
+    def __init__(self, time_window: int = 30.0, persist: bool = None, max_rows: int = None):
+        self.stats = StatsRing()
         self.time_window = time_window
         self.lock = threading.Lock()
 
+        if persist is None:
+            persist = bool(Context.get_parameter('STATS_PERSIST', 'True', direct=False))
+        if max_rows is None:
+            max_rows = int(Context.get_parameter('STATS_MAX_ROWS', 10000))
+        self.writer = StatsWriter('stats.csv', max_rows) if persist else None
+
     def update_stats(self, entry: StatsEntry):
         '''
         Update the stats.
         Called when a new inference is done.
         Remove the outdated stats and append the new stats.
         '''
-        # append the new stats
-        self.stats.append(entry)
-        # remove the outdated stats
-        while self.stats and entry.timestamp - self.stats[0].timestamp > self.time_window:
-            self.stats.popleft()
-
-        result_path = Context.get_file_path('stats.csv')
-        # 现有结果写入一个文件, csv格式
-        with open(result_path, 'w') as f:
-            f.write('timestamp,queue_length,cur_model_index,cur_model_accuracy,processing_latency,target_nums,avg_confidence,std_confidence,avg_size,std_size,brightness,contrast\n')
-            for entry in self.stats:
-                f.write(f'{entry.timestamp},{entry.queue_length},{entry.cur_model_index},{entry.cur_model_accuracy},{entry.processing_latency},{entry.target_nums},{entry.avg_confidence},{entry.std_confidence},{entry.avg_size},{entry.std_size},{entry.brightness},{entry.contrast}\n')
+        with self.lock:
+            # append the new stats
+            self.stats.append(entry)
+            # remove the outdated stats
+            while self.stats and entry.timestamp - self.stats[0].timestamp > self.time_window:
+                self.stats.popleft()
+
+        if self.writer is not None:
+            self.writer.write(entry)
 
     def get_latest_stats(self, nums: int = 1):
         '''
@@ -79,10 +187,10 @@ class StatsManager:
                 return None
             # 如果请求的数量大于当前的数量，在列表前面补默认值
             elif len(self.stats) < nums:
-                return [StatsEntry()] * (nums - len(self.stats)) + list(self.stats)
+                return [StatsEntry()] * (nums - len(self.stats)) + self.stats.latest(nums)
             else:
-                return list(self.stats)[-nums:]  # 返回最新的nums个元素
-            
+                return self.stats.latest(nums)  # 返回最新的nums个元素
+
     def get_interval_stats(self, nums: int = 1, interval: float = 1.0):
         '''
         Get the statistics at intervals
@@ -92,30 +200,20 @@ class StatsManager:
         with self.lock:
             if not self.stats:
                 return [None] * nums
-                
+
             result = [StatsEntry()] * nums
             current_time = self.stats[-1].timestamp
-            
-            # 使用二分查找优化查找过程
-            stats_list = list(self.stats)  # 转换为列表以支持索引访问
-            
+
             for i in range(nums):
                 target_time = current_time - i * interval
-                
                 # 二分查找找到最接近且不大于目标时间的统计数据
-                left, right = 0, len(stats_list) - 1
-                closest_index = -1
-                
-                while left <= right:
-                    mid = (left + right) // 2
-                    if stats_list[mid].timestamp <= target_time:
-                        closest_index = mid
-                        left = mid + 1
-                    else:
-                        right = mid - 1
-                
+                closest_index = self.stats.bisect_right(target_time) - 1
                 if closest_index != -1:
-                    result[nums - 1 - i] = stats_list[closest_index]  # 确保按时间从老到新排序
-                    
+                    result[nums - 1 - i] = self.stats[closest_index]  # 确保按时间从老到新排序
+
             return result
-            
\ No newline at end of file
+
+    def close(self):
+        if self.writer is not None:
+            with self.writer.lock:
+                self.writer.close()
@@ -1,5 +1,6 @@
 import threading
 from .base_inference import BaseInference
+from .model_registry import ModelRegistry
 from typing import List
 import numpy as np
 import os
@@ -20,7 +21,10 @@ warnings.filterwarnings("ignore")
 class YoloInference(BaseInference):
     def __init__(self, *args, **kwargs):
         '''
-        Load all models, do all the necessary initializations.
+        Prepare the models, do all the necessary initializations.
+        Models are loaded lazily on their first use (only the first available model is loaded here),
+        optionally within a memory budget (memory_budget, in MB) beyond which the least recently used ones are evicted.
+        Latencies are seeded from model_latency (in seconds, if given) and refined by EMA during serving.
         '''
         super().__init__(*args, **kwargs)
         # models should be a sorted list of pareto optimal models, so that the switcher can switch between them.
@@ -28,75 +32,75 @@ class YoloInference(BaseInference):
         # official mAP values.
         self.model_accuracy =kwargs['model_accuracy']
         # assert len(self.allowed_yolo_models) == len(self.model_accuracy), 'Model names and accuracies do not match'
-        self.model_latency = []
         # ema_alpha for model latency updates
         self.ema_alpha = 0.2
-        self.models = []
         # assert 'weights_dir' in kwargs, 'weights_dir not provided'
         self.weights_dir = kwargs['weights_dir']
         # for model_name in self.allowed_yolo_models:
         #     model_path = f"{self.weights_dir}/{model_name}.pt"
         #     assert os.path.exists(model_path), f"Model weights file not found: {model_path}"
+        self.models = ModelRegistry(self.allowed_yolo_models, self._load_model,
+                                    memory_budget=float(kwargs.get('memory_budget', 0)) * 1024 * 1024,
+                                    latency=kwargs.get('model_latency'),
+                                    ema_alpha=self.ema_alpha)
         self.current_model_index = None
         self.model_switch_lock = threading.Lock()
-        self._load_all_models()
-        self._measure_initial_latencies()
+        self._load_initial_model()
 
-    def _load_all_models(self):
-        print('Loading all YOLOv5 models...')
-        for model_name in self.allowed_yolo_models:
-            # model_path = f"{self.weights_dir}/{model_name}.pt"
-            relative_model_path = f"{self.weights_dir}/{model_name}.pt"
-            model_path = Context.get_file_path(relative_model_path)
-            try:
-                print(f'Loading model: {model_name}...')
-                model = attempt_load(model_path)
-                model = AutoShape(model)
-                model.eval()
-                if torch.cuda.is_available():
-                    model = model.cuda()
-                self.models.append(model)
-                print(f'Model loaded: {model_name}.')
-            except Exception as e:
-                print(f'Error loading model {model_name}: {str(e)}!')
-            
-        print('All models loaded.')
-        with self.model_switch_lock:
-            self.current_model_index = 0
-        print(f'Switched to model: {self.allowed_yolo_models[self.current_model_index]}.')
+    def _load_model(self, index: int):
+        model_name = self.allowed_yolo_models[index]
+        relative_model_path = f"{self.weights_dir}/{model_name}.pt"
+        model_path = Context.get_file_path(relative_model_path)
+        print(f'Loading model: {model_name}...')
+        model = attempt_load(model_path)
+        model = AutoShape(model)
+        model.eval()
+        if torch.cuda.is_available():
+            model = model.cuda()
+        print(f'Model loaded: {model_name}.')
+        return model
 
-    def _measure_initial_latencies(self):
-        print("Measuring initial latencies...")
-        dummy_input = np.random.randint(0, 255, (640, 640, 3), dtype=np.uint8)
-        
-        for idx, model in enumerate(self.models):
-            times = []
-            # 预热
-            for _ in range(5):
-                model(dummy_input)
-            
-            # 测量
-            for _ in range(10):
-                start_time = time.perf_counter()
-                with torch.no_grad():
-                    model(dummy_input)
-                times.append(time.perf_counter() - start_time)
-            self.model_latency.append(np.mean(times))
-            print(f'Model {idx} takes time: {self.model_latency[idx]}')
+    def _load_initial_model(self):
+        for index in range(len(self.models)):
+            if self.models.get(index) is not None:
+                with self.model_switch_lock:
+                    self.current_model_index = index
+                print(f'Switched to model: {self.allowed_yolo_models[self.current_model_index]}.')
+                return
+        raise RuntimeError(f'None of YOLOv5 models {self.allowed_yolo_models} can be loaded')
 
     def switch_model(self, index: int):
         '''
         Switch the model to the one specified in the arguments.
-        '''
+        The model is loaded before switching (without blocking the inference),
+        an unavailable model is not switched to and the current model is kept.
+        Loading the model does not evict the current one, which may still be in use.
+        '''
+        if index >= len(self.models) or index < 0:
+            raise ValueError('Invalid model index')
+        if self.models.get(index, keep=(self.current_model_index,)) is None:
+            print(f'Model {self.allowed_yolo_models[index]} is unavailable, '
+                  f'keep model: {self.allowed_yolo_models[self.current_model_index]}')
+            return
         with self.model_switch_lock:
-            if index >= len(self.models) or index < 0:
-                raise ValueError('Invalid model index')
             self.current_model_index = index
             print(f'Switched to model: {self.allowed_yolo_models[self.current_model_index]}')
 
+    def _fallback_model(self):
+        # called with model_switch_lock held
+        for index in reversed(self.models.get_loaded_indices()):
+            model = self.models.get(index)
+            if model is not None:
+                print(f'Model {self.allowed_yolo_models[self.current_model_index]} is unavailable, '
+                      f'switched to model: {self.allowed_yolo_models[index]}')
+                self.current_model_index = index
+                return model
+        raise RuntimeError(f'Model {self.allowed_yolo_models[self.current_model_index]} is unavailable '
+                           f'and no other model is loaded')
+
     def get_models_num(self):
         '''
-        Get the number of models.
+        Get the number of models (including unavailable ones, so that indices match the configured models).
         '''
         return len(self.models)
     
@@ -112,7 +116,7 @@ class YoloInference(BaseInference):
         Get the latency of the models.
         Returns a list of floats.
         '''
-        return self.model_latency
+        return self.models.get_latencies()
     
     def get_current_model_index(self):
         '''
@@ -124,21 +128,33 @@ class YoloInference(BaseInference):
         '''
         Do the inference on the image.
         '''
+        return self.infer_batch([image])[0]
+
+    def infer_batch(self, images: List[np.ndarray]):
+        '''
+        Do the inference on a batch of images in one forward pass of the current model.
+        AutoShape letterboxes the images to a common (stride-aligned) shape and scales the boxes back to each image.
+        The model is locked for the whole batch, so that it is only switched between batches.
+        If the current model can not be reloaded, the most recently used loaded model is switched to.
+        '''
         with self.model_switch_lock:
-            model = self.models[self.current_model_index]
+            model = self.models.get(self.current_model_index)
+            if model is None:
+                model = self._fallback_model()
             start_time = time.perf_counter()
             with torch.no_grad():
-                results = model(image)
-            inference_latency = time.perf_counter() - start_time
+                results = model(list(images))
+            # latency per image of the batch
+            inference_latency = (time.perf_counter() - start_time) / len(images)
             # use ema to update latency
-            self.model_latency[self.current_model_index] = self.ema_alpha * inference_latency + (1 - self.ema_alpha) * self.model_latency[self.current_model_index]
-            boxes, scores, labels = self.process_results(results)
-        
+            self.models.update_latency(self.current_model_index, inference_latency)
+            outputs = [self.process_results(results, index) for index in range(len(images))]
+
         # start a new thread to update stats
-        update_stats_thread = threading.Thread(target=self.prepare_update_stats, args=(image, boxes, scores, labels, inference_latency))
+        update_stats_thread = threading.Thread(target=self.prepare_update_batch_stats, args=(images, outputs, inference_latency))
         update_stats_thread.start()
-        
-        return boxes, scores, labels
+
+        return outputs
     
     def prepare_update_stats(self, image: np.ndarray, boxes, scores, labels, inference_latency):
         '''
@@ -147,12 +163,12 @@ class YoloInference(BaseInference):
         super().prepare_update_stats(image, boxes, scores, labels, inference_latency)
 
         
-    def process_results(self, results):
+    def process_results(self, results, index: int = 0):
         '''
-        Extract from yolo detection results three np lists: boxes, scores, labels
+        Extract from yolo detection results of the index-th image three np lists: boxes, scores, labels
         '''
-        boxes = results.xyxy[0][:, :4].cpu().numpy().tolist()
-        scores = results.xyxy[0][:, 4].cpu().numpy().tolist()
-        labels = results.xyxy[0][:, 5].cpu().numpy().tolist()
+        boxes = results.xyxy[index][:, :4].cpu().numpy().tolist()
+        scores = results.xyxy[index][:, 4].cpu().numpy().tolist()
+        labels = results.xyxy[index][:, 5].cpu().numpy().tolist()
 
         return boxes, scores, labels
@@ -1,7 +1,7 @@
 import os
 
 from core.lib.estimation import TimeEstimator
-from core.lib.network import http_request
+from core.lib.network import http_request, HttpSessionPool
 from core.lib.common import LOGGER
 from core.lib.common import Context
 from core.lib.common import SystemConstant
@@ -37,7 +37,7 @@ class Controller:
 
         http_request(url=controller_address,
                      method=NetworkAPIMethod.CONTROLLER_TASK,
-                     data={'data': cur_task.serialize()},
+                     data={'data': cur_task.serialize(HttpSessionPool.negotiate_task_codec(controller_address))},
                      files={'file': (cur_task.get_file_path(),
                                      open(cur_task.get_file_path(), 'rb'),
                                      'multipart/form-data')})
@@ -52,6 +52,8 @@ class Controller:
         if service not in self.service_ports_dict:
             LOGGER.warning(f'[Service Not Exist] Service {service} does not exist in {self.local_device} '
                            f'(has service: {self.service_ports_dict.keys()})')
+            # service ports may be outdated (eg: service redeployed), revalidate them for following tasks
+            PortInfo.invalidate_cache()
 
         service_address = merge_address(NodeInfo.hostname2ip(self.local_device),
                                         port=self.service_ports_dict[service],
@@ -64,7 +66,7 @@ class Controller:
 
         http_request(url=service_address,
                      method=NetworkAPIMethod.PROCESSOR_PROCESS,
-                     data={'data': cur_task.serialize()},
+                     data={'data': cur_task.serialize(HttpSessionPool.negotiate_task_codec(service_address))},
                      files={'file': (cur_task.get_file_path(),
                                      open(cur_task.get_file_path(), 'rb'),
                                      'multipart/form-data')}
@@ -84,7 +86,7 @@ class Controller:
         http_request(url=self.distribute_address,
                      method=NetworkAPIMethod.DISTRIBUTOR_DISTRIBUTE,
                      files={'file': (cur_task.get_file_path(), file_content, 'multipart/form-data')},
-                     data={'data': cur_task.serialize()})
+                     data={'data': cur_task.serialize(HttpSessionPool.negotiate_task_codec(self.distribute_address))})
 
         LOGGER.info(f'[To Distributor] source: {cur_task.get_source_id()}  task: {cur_task.get_task_id()} '
                     f'current service: {cur_task.get_flow_index()}')
@@ -3,10 +3,10 @@ from fastapi import FastAPI, BackgroundTasks, UploadFile, File, Form
 from fastapi.routing import APIRoute
 from starlette.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from core.lib.network import NetworkAPIPath, NetworkAPIMethod
+from core.lib.network import NetworkAPIPath, NetworkAPIMethod, TaskCodecMiddleware
 from core.lib.common import FileOps
 from core.lib.common import Context
-from core.lib.content import Task
+from core.lib.content import Task, TaskCodec
 
 from .controller import Controller
 
@@ -32,6 +32,7 @@ class ControllerServer:
             CORSMiddleware, allow_origins=["*"], allow_credentials=True,
             allow_methods=["*"], allow_headers=["*"],
         )
+        self.app.add_middleware(TaskCodecMiddleware, codecs=TaskCodec.get_supported_codecs())
 
         self.is_delete_temp_files = Context.get_parameter('DELETE_TEMP_FILES', direct=False)
 
@@ -1,12 +1,15 @@
 import os
 import sqlite3
-import time
-from datetime import datetime
+import threading
 
 from core.lib.content import Task
 from core.lib.estimation import TimeEstimator
-from core.lib.common import LOGGER, FileNameConstant, FileOps, SystemConstant
-from core.lib.network import http_request, NodeInfo, merge_address, NetworkAPIMethod, NetworkAPIPath, PortInfo
+from core.lib.common import LOGGER, FileNameConstant, FileOps, SystemConstant, Context
+from core.lib.network import NodeInfo, merge_address, NetworkAPIPath, PortInfo
+
+from .record_writer import RecordWriter
+from .record_retention import RecordRetention
+from .scenario_sender import ScenarioSender
 
 
 class Distributor:
@@ -14,7 +17,10 @@ class Distributor:
     Distributor with SQLite persistence.
     - Removed 'is_visited' column. Incremental reads are driven solely by time_ticket.
     - Uses WAL and busy timeouts to wait on locks instead of raising 'database is locked'.
-    - All SQL is parameterized; connections are context-managed to avoid leaks.
+    - All SQL is parameterized.
+    - Records are inserted by a long-lived `RecordWriter` in group transactions,
+      queries share one long-lived reader connection.
+    - Old records are evicted in background by `RecordRetention` (max age / rows / bytes, optionally archived).
     """
 
     # ---- Connection/SQLite tuning parameters ----
@@ -22,6 +28,7 @@ class Distributor:
     _BUSY_TIMEOUT_MS = 5000  # PRAGMA busy_timeout: how long SQLite will wait for locks inside a connection
     _JOURNAL_MODE = "WAL"  # Better read/write concurrency
     _SYNCHRONOUS = "NORMAL"  # Reasonable durability with good throughput (can be "FULL" if you prefer)
+    _JOURNAL_SIZE_LIMIT = 4 * 1024 * 1024  # PRAGMA journal_size_limit: bytes the WAL file is truncated to
 
     def __init__(self):
         self.scheduler_hostname = NodeInfo.get_cloud_node()
@@ -31,12 +38,39 @@ class Distributor:
             port=self.scheduler_port,
             path=NetworkAPIPath.SCHEDULER_SCENARIO
         )
+        self.scheduler_batch_address = merge_address(
+            NodeInfo.hostname2ip(self.scheduler_hostname),
+            port=self.scheduler_port,
+            path=NetworkAPIPath.SCHEDULER_SCENARIO_BATCH
+        )
         self.record_path = FileNameConstant.DISTRIBUTOR_RECORD.value
 
         # Initialize DB schema and indexes
         self._init_db()
 
-    def _connect(self, *, autocommit=False):
+        self.writer = RecordWriter(self.record_path, self._connect_writer,
+                                   batch_size=int(Context.get_parameter('DB_BATCH_SIZE', 64)),
+                                   flush_interval=float(Context.get_parameter('DB_FLUSH_INTERVAL', 0.1)),
+                                   max_queue_size=int(Context.get_parameter('DB_QUEUE_SIZE', 10000)))
+        self.retention = RecordRetention(self.record_path, self._connect_maintainer,
+                                         max_age=float(Context.get_parameter('DB_RETENTION_MAX_AGE', 0)),
+                                         max_rows=int(Context.get_parameter('DB_RETENTION_MAX_ROWS', 0)),
+                                         max_bytes=int(Context.get_parameter('DB_RETENTION_MAX_BYTES', 0)),
+                                         interval=float(Context.get_parameter('DB_RETENTION_INTERVAL', 30)),
+                                         chunk_size=int(Context.get_parameter('DB_RETENTION_CHUNK_SIZE', 500)),
+                                         archive_dir=Context.get_parameter('DB_ARCHIVE_DIR', ''))
+        self.scenario_sender = ScenarioSender(self.scheduler_address, self.scheduler_batch_address,
+                                              batched=Context.get_parameter('SCENARIO_BATCHED', 'True', direct=False),
+                                              batch_size=int(Context.get_parameter('SCENARIO_BATCH_SIZE', 16)),
+                                              flush_interval=float(Context.get_parameter('SCENARIO_FLUSH_INTERVAL',
+                                                                                         0.05)),
+                                              max_queue_size=int(Context.get_parameter('SCENARIO_QUEUE_SIZE', 10000)))
+
+        self._reader = None
+        self._reader_inode = None
+        self._reader_lock = threading.Lock()
+
+    def _connect(self, *, autocommit=False, check_same_thread=True):
         """
         Create a new SQLite connection with:
         - timeout: waits for the specified seconds if the DB is locked
@@ -50,18 +84,56 @@ class Distributor:
             timeout=self._CONNECT_TIMEOUT_SECS,
             isolation_level=isolation_level,
             detect_types=0,
-            check_same_thread=True,  # set False only if you truly share the connection across threads
+            check_same_thread=check_same_thread,  # False only for the lock-guarded shared reader
         )
         cur = conn.cursor()
         # Apply pragmas every time (safe & ensures settings survive across new connections)
         cur.execute(f"PRAGMA busy_timeout={self._BUSY_TIMEOUT_MS};")
+        # Must precede journal_mode to take effect on new databases, lets retention release evicted pages
+        cur.execute("PRAGMA auto_vacuum=INCREMENTAL;")
         cur.execute(f"PRAGMA journal_mode={self._JOURNAL_MODE};")
         cur.execute(f"PRAGMA synchronous={self._SYNCHRONOUS};")
+        # Truncate the WAL file after checkpoints instead of keeping it at its peak size
+        cur.execute(f"PRAGMA journal_size_limit={self._JOURNAL_SIZE_LIMIT};")
         # Slightly bigger page cache can help for repeated scans
         cur.execute("PRAGMA cache_size=-8000;")  # ~8MB cache; negative means KB
         conn.commit()
         return conn
 
+    def _connect_writer(self):
+        # the database may have been removed (cleared) since the last connection
+        self._init_db()
+        return self._connect()
+
+    def _connect_maintainer(self):
+        return self._connect(autocommit=True)
+
+    def _read(self, sql, params=()):
+        """Run a query on the shared reader connection (reopened if the database file was replaced)."""
+        with self._reader_lock:
+            inode = os.stat(self.record_path).st_ino if os.path.exists(self.record_path) else None
+            if self._reader is not None and inode != self._reader_inode:
+                self._close_reader()
+            if self._reader is None:
+                self._init_db()
+                self._reader = self._connect(autocommit=True, check_same_thread=False)
+                self._reader_inode = os.stat(self.record_path).st_ino
+            return self._reader.execute(sql, params).fetchall()
+
+    def _close_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+        self._reader = None
+        self._reader_inode = None
+
+    def close(self):
+        """Commit all queued records and close connections (called on orderly shutdown)."""
+        self.retention.close()
+        self.writer.close()
+        self.scenario_sender.close()
+        with self._reader_lock:
+            self._close_reader()
+
     def _init_db(self):
         """Create table and indexes if not present."""
         # Ensure DB directory exists if a directory component is present
@@ -108,28 +180,11 @@ class Distributor:
 
     def save_task_record(self, cur_task: Task):
         """
-        Insert or update a record for the task.
-        NOTE: Try INSERT first, and on conflict log a warning (same behavior as original).
+        Queue a record of the task for the writer, which inserts it within the next group transaction.
+        NOTE: On (source_id, task_id) conflict the writer logs a warning (same behavior as original).
         """
         self.record_total_end_ts(cur_task)
-        task_source_id = cur_task.get_source_id()
-        task_task_id = cur_task.get_task_id()
-        task_ctime = datetime.now().timestamp()
-
-        try:
-            with self._connect() as conn:
-                c = conn.cursor()
-                # Explicit transaction.
-                c.execute("BEGIN;")
-                c.execute(
-                    "INSERT INTO records (source_id, task_id, ctime, json) VALUES (?, ?, ?, ?)",
-                    (task_source_id, task_task_id, task_ctime, cur_task.serialize())
-                )
-                conn.commit()
-        except sqlite3.IntegrityError:
-            LOGGER.warning(
-                f'[Task Name Conflict] source_id: {task_source_id}, task_id: {task_task_id} already exists.'
-            )
+        self.writer.put(cur_task.get_source_id(), cur_task.get_task_id(), cur_task.serialize())
 
     @staticmethod
     def record_total_end_ts(cur_task):
@@ -137,21 +192,13 @@ class Distributor:
 
     def send_scenario_to_scheduler(self, cur_task: Task):
         """
-        Send scenario to scheduler with simple retries and short timeouts.
-        Network errors are logged and retried; DB is unaffected.
+        Queue scenario of the task for the scenario sender, which sends it to scheduler in a batch.
+        Network errors are logged by the sender; DB is unaffected.
         """
         assert cur_task, 'Current task is None'
         LOGGER.info(f'[Send Scenario] source: {cur_task.get_source_id()}  task: {cur_task.get_task_id()}')
 
-        try:
-            http_request(
-                url=self.scheduler_address,
-                method=NetworkAPIMethod.SCHEDULER_SCENARIO,
-                data={'data': cur_task.serialize()})
-
-        except Exception as e:
-            LOGGER.warning(f"Send scenario to scheduler failed: {e}")
-            LOGGER.exception(e)
+        self.scenario_sender.put(cur_task)
 
     @staticmethod
     def record_transmit_ts(cur_task):
@@ -171,33 +218,27 @@ class Distributor:
         if self.is_database_empty():
             return {'result': [], 'time_ticket': time_ticket, 'size': 0}
 
-        # Read-only transaction is sufficient; we still want consistent snapshot
-        with self._connect() as conn:
-            c = conn.cursor()
-
-            if size and size > 0:
-                c.execute(
-                    """
-                    SELECT source_id, task_id, ctime, json
-                    FROM records
-                    WHERE ctime > ?
-                    ORDER BY ctime DESC LIMIT ?
-                    """,
-                    (time_ticket, size)
-                )
-                rows = c.fetchall()
-                rows = rows[::-1]
-            else:
-                c.execute(
-                    """
-                    SELECT source_id, task_id, ctime, json
-                    FROM records
-                    WHERE ctime > ?
-                    ORDER BY ctime ASC
-                    """,
-                    (time_ticket,)
-                )
-                rows = c.fetchall()
+        if size and size > 0:
+            rows = self._read(
+                """
+                SELECT source_id, task_id, ctime, json
+                FROM records
+                WHERE ctime > ?
+                ORDER BY ctime DESC LIMIT ?
+                """,
+                (time_ticket, size)
+            )
+            rows = rows[::-1]
+        else:
+            rows = self._read(
+                """
+                SELECT source_id, task_id, ctime, json
+                FROM records
+                WHERE ctime > ?
+                ORDER BY ctime ASC
+                """,
+                (time_ticket,)
+            )
 
         if not rows:
             LOGGER.debug(f'No new records, last file time unchanged: {time_ticket}')
@@ -221,29 +262,27 @@ class Distributor:
         if self.is_database_empty():
             return {'result': [], 'size': 0}
 
-        with self._connect() as conn:
-            c = conn.cursor()
-            if source_id is not None:
-                c.execute(
-                    """
-                    SELECT json
-                    FROM records
-                    WHERE ctime BETWEEN ? AND ? AND source_id = ?
-                    ORDER BY ctime ASC
-                    """,
-                    (start_time, end_time, source_id)
-                )
-            else:
-                c.execute(
-                    """
-                    SELECT json
-                    FROM records
-                    WHERE ctime BETWEEN ? AND ?
-                    ORDER BY ctime ASC
-                    """,
-                    (start_time, end_time)
-                )
-            results = [row[0] for row in c.fetchall()]
+        if source_id is not None:
+            rows = self._read(
+                """
+                SELECT json
+                FROM records
+                WHERE ctime BETWEEN ? AND ? AND source_id = ?
+                ORDER BY ctime ASC
+                """,
+                (start_time, end_time, source_id)
+            )
+        else:
+            rows = self._read(
+                """
+                SELECT json
+                FROM records
+                WHERE ctime BETWEEN ? AND ?
+                ORDER BY ctime ASC
+                """,
+                (start_time, end_time)
+            )
+        results = [row[0] for row in rows]
 
         return {'result': results, 'size': len(results)}
 
@@ -254,23 +293,27 @@ class Distributor:
         if self.is_database_empty():
             return {'result': [], 'size': 0}
 
-        with self._connect() as conn:
-            c = conn.cursor()
-            c.execute(
-                """
-                SELECT json
-                FROM records
-                ORDER BY source_id ASC, task_id ASC
-                """
-            )
-            results = [row[0] for row in c.fetchall()]
+        rows = self._read(
+            """
+            SELECT json
+            FROM records
+            ORDER BY source_id ASC, task_id ASC
+            """
+        )
+        results = [row[0] for row in rows]
 
         return {'result': results, 'size': len(results)}
 
     def clear_database(self):
-        """Remove the DB file entirely."""
-        FileOps.remove_file(self.record_path)
+        """Remove the DB file entirely (records queued before clearing are committed and removed as well)."""
+        with self._reader_lock:
+            self._close_reader()
+            self.writer.execute(self._remove_database)
         LOGGER.info('[Distributor] Database Cleared')
+
+    def _remove_database(self):
+        for suffix in ('', '-wal', '-shm'):
+            FileOps.remove_file(self.record_path + suffix)
         self._init_db()
 
     def is_database_empty(self):
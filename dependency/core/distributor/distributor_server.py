@@ -6,9 +6,9 @@ from starlette.responses import JSONResponse, FileResponse
 from starlette.requests import Request
 from fastapi.middleware.cors import CORSMiddleware
 
-from core.lib.network import NetworkAPIPath, NetworkAPIMethod
+from core.lib.network import NetworkAPIPath, NetworkAPIMethod, TaskCodecMiddleware
 from core.lib.common import FileOps
-from core.lib.content import Task
+from core.lib.content import Task, TaskCodec
 from .distributor import Distributor
 
 
@@ -55,12 +55,13 @@ class DistributorServer:
                      response_class=JSONResponse,
                      methods=[NetworkAPIMethod.DISTRIBUTOR_IS_DATABASE_EMPTY]
                      ),
-        ], log_level='trace', timeout=6000)
+        ], log_level='trace', timeout=6000, on_shutdown=[self.distributor.close])
 
         self.app.add_middleware(
             CORSMiddleware, allow_origins=["*"], allow_credentials=True,
             allow_methods=["*"], allow_headers=["*"],
         )
+        self.app.add_middleware(TaskCodecMiddleware, codecs=TaskCodec.get_supported_codecs())
 
     async def distribute_data(self, backtask: BackgroundTasks, file: UploadFile = File(...), data: str = Form(...)):
         file_data = await file.read()
@@ -0,0 +1,207 @@
+import gzip
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl  # POSIX file locking
+except Exception:  # pragma: no cover
+    fcntl = None
+
+from core.lib.common import LOGGER
+
+
+class RecordRetention:
+    """
+    Background retention of distributed task records.
+    - Oldest records (by ctime) are evicted once they are older than `max_age` seconds, the table holds more than
+      `max_rows` records or the database file uses more than `max_bytes` (0 disables a limit,
+      the WAL file is bounded separately by the journal size limit).
+    - Evictions run every `interval` seconds in small transactions of `chunk_size` records,
+      so the record writer and readers only ever wait for one chunk.
+    - Evicted records are appended to gzip compressed json-lines segment files in `archive_dir` (if set)
+      before they are deleted, one segment per retention round.
+    - Only one process enforces retention of a database at a time (eg: with several server workers).
+    """
+
+    # evict down to this fraction of `max_rows` / `max_bytes` so that limits are not hit again on the next round
+    LOW_WATERMARK = 0.9
+
+    def __init__(self, record_path: str, connect, max_age: float = 0, max_rows: int = 0, max_bytes: int = 0,
+                 interval: float = 30, chunk_size: int = 500, archive_dir: str = ''):
+        self.record_path = record_path
+        self.connect = connect
+        self.max_age = float(max_age)
+        self.max_rows = int(max_rows)
+        self.max_bytes = int(max_bytes)
+        self.interval = float(interval)
+        self.chunk_size = max(int(chunk_size), 1)
+        self.archive_dir = archive_dir
+
+        self.evicted_records = 0
+        self.archived_segments = 0
+
+        self.stop_event = threading.Event()
+        self.thread = None
+        if self.is_enabled():
+            self.thread = threading.Thread(target=self.loop_retain, daemon=True)
+            self.thread.start()
+
+    def is_enabled(self) -> bool:
+        return self.max_age > 0 or self.max_rows > 0 or self.max_bytes > 0
+
+    def close(self, timeout=None) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def loop_retain(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.retain()
+            except Exception as e:
+                LOGGER.warning(f'[Record Retention] Retention round failed: {str(e)}')
+                LOGGER.exception(e)
+
+    def retain(self) -> int:
+        """run one retention round, return the number of evicted records"""
+        if not os.path.exists(self.record_path):
+            return 0
+        with open(self.record_path + '.retention', 'a') as lock_file:
+            if not self._try_lock(lock_file):
+                return 0
+            conn = self.connect()
+            segment = RecordSegment(self.archive_dir) if self.archive_dir else None
+            try:
+                evicted = self._evict_aged(conn, segment) + self._evict_rows(conn, segment) + \
+                          self._evict_bytes(conn, segment)
+                if evicted:
+                    # release the pages of evicted records (effective for databases created with auto_vacuum)
+                    # (executescript steps the pragma to completion, a single step releases one page only)
+                    conn.executescript("PRAGMA incremental_vacuum;")
+                    conn.execute("PRAGMA wal_checkpoint(PASSIVE);")
+            finally:
+                conn.close()
+                if segment is not None:
+                    self.archived_segments += segment.close()
+
+        if evicted:
+            self.evicted_records += evicted
+            LOGGER.info(f'[Record Retention] Evicted {evicted} records '
+                        f'({self.evicted_records} in total, {self.archived_segments} archive segments)')
+        return evicted
+
+    def _evict_aged(self, conn, segment) -> int:
+        if self.max_age <= 0:
+            return 0
+        deadline = time.time() - self.max_age
+        evicted = 0
+        while not self.stop_event.is_set():
+            count = self._evict_chunk(conn, segment, "WHERE ctime < ?", (deadline,))
+            evicted += count
+            if count < self.chunk_size:
+                break
+        return evicted
+
+    def _evict_rows(self, conn, segment) -> int:
+        if self.max_rows <= 0:
+            return 0
+        total = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        if total <= self.max_rows:
+            return 0
+        return self._evict_oldest(conn, segment, total - int(self.max_rows * self.LOW_WATERMARK))
+
+    def _evict_bytes(self, conn, segment) -> int:
+        if self.max_bytes <= 0:
+            return 0
+        used_bytes = self.get_used_bytes(conn)
+        if used_bytes <= self.max_bytes:
+            return 0
+        total = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        if not total:
+            return 0
+        # bound the round by the records to evict now, instead of chasing records inserted meanwhile
+        target = self.max_bytes * self.LOW_WATERMARK
+        return self._evict_oldest(conn, segment, math.ceil((used_bytes - target) / (used_bytes / total)))
+
+    def _evict_oldest(self, conn, segment, excess: int) -> int:
+        evicted = 0
+        while evicted < excess and not self.stop_event.is_set():
+            count = self._evict_chunk(conn, segment, limit=min(self.chunk_size, excess - evicted))
+            if not count:
+                break
+            evicted += count
+        return evicted
+
+    def _evict_chunk(self, conn, segment, where: str = '', params: tuple = (), limit: int = None) -> int:
+        rows = conn.execute(
+            f"SELECT rowid, source_id, task_id, ctime, json FROM records {where} ORDER BY ctime ASC LIMIT ?",
+            params + (limit or self.chunk_size,)
+        ).fetchall()
+        if not rows:
+            return 0
+        # archive before deleting: an interrupted round may archive records twice but never loses them
+        if segment is not None:
+            segment.write(rows)
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            conn.executemany("DELETE FROM records WHERE rowid = ?", [(row[0],) for row in rows])
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        return len(rows)
+
+    @staticmethod
+    def get_used_bytes(conn) -> int:
+        """bytes of database pages in use (free pages are reused before the file grows)"""
+        page_size = conn.execute("PRAGMA page_size;").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count;").fetchone()[0]
+        freelist_count = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        return (page_count - freelist_count) * page_size
+
+    @staticmethod
+    def _try_lock(file_obj) -> bool:
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(file_obj.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+
+class RecordSegment:
+    """gzip compressed json-lines archive segment, named by the ctime range of its records once closed"""
+
+    def __init__(self, archive_dir: str):
+        self.archive_dir = archive_dir
+        self.file = None
+        self.part_path = None
+        self.first_ctime = None
+        self.last_ctime = None
+
+    def write(self, rows):
+        if self.file is None:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            self.part_path = os.path.join(self.archive_dir, f'records-{os.getpid()}-{time.time():.6f}.jsonl.gz.part')
+            self.file = gzip.open(self.part_path, 'wt', encoding='utf-8')
+        for _, source_id, task_id, ctime, record in rows:
+            self.file.write(json.dumps({'source_id': source_id, 'task_id': task_id,
+                                        'ctime': ctime, 'json': record}) + '\n')
+            self.first_ctime = ctime if self.first_ctime is None else min(self.first_ctime, ctime)
+            self.last_ctime = ctime if self.last_ctime is None else max(self.last_ctime, ctime)
+        self.file.flush()
+
+    def close(self) -> int:
+        """close the segment, return the number of archived segments (0 if nothing was written)"""
+        if self.file is None:
+            return 0
+        self.file.close()
+        self.file = None
+        os.replace(self.part_path, os.path.join(self.archive_dir,
+                                                f'records-{self.first_ctime:.6f}-{self.last_ctime:.6f}.jsonl.gz'))
+        return 1
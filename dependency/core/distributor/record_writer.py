@@ -0,0 +1,145 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from core.lib.common import LOGGER
+
+
+class RecordWriter:
+    """
+    Long-lived SQLite writer of distributed task records.
+    - Records are queued (bounded, `put` blocks when full) and inserted by one writer thread
+      in group transactions, committed every `batch_size` records or `flush_interval` seconds.
+    - ctime is stamped at commit time, so committed ctimes never go backwards for incremental readers.
+    - The connection is reopened if the database file is removed/replaced (eg: cleared by another worker).
+    """
+
+    _STOP = object()
+
+    def __init__(self, record_path: str, connect, batch_size: int = 64, flush_interval: float = 0.1,
+                 max_queue_size: int = 10000):
+        self.record_path = record_path
+        self.connect = connect
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = float(flush_interval)
+
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.conn = None
+        self.conn_inode = None
+
+        self.written_records = 0
+        self.last_ctime = 0.0
+
+        self.thread = threading.Thread(target=self.loop_write, daemon=True)
+        self.thread.start()
+
+    def put(self, source_id: int, task_id: int, record: str) -> None:
+        self.queue.put((source_id, task_id, record))
+
+    def flush(self, timeout=None) -> bool:
+        """block until all records queued before this call are committed"""
+        return self.execute(None, timeout=timeout)
+
+    def execute(self, func, timeout=None) -> bool:
+        """commit queued records, close the connection and run `func` in the writer thread"""
+        done = threading.Event()
+        self.queue.put((func, done))
+        return done.wait(timeout)
+
+    def close(self, timeout=None) -> None:
+        if not self.thread.is_alive():
+            return
+        self.queue.put(self._STOP)
+        self.thread.join(timeout)
+
+    def loop_write(self):
+        pending = []
+        first_pending_time = None
+        while True:
+            wait_time = self.flush_interval - (time.time() - first_pending_time) if pending else None
+            try:
+                item = self.queue.get(timeout=max(wait_time, 0) if wait_time is not None else None)
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                self.write_records(pending)
+                self.close_connection()
+                break
+
+            if isinstance(item, tuple) and len(item) == 2:
+                func, done = item
+                self.write_records(pending)
+                pending = []
+                if func:
+                    self.close_connection()
+                    self.run_safely(func)
+                done.set()
+                continue
+
+            if item is not None:
+                if not pending:
+                    first_pending_time = time.time()
+                pending.append(item)
+
+            if pending and (len(pending) >= self.batch_size or
+                            time.time() - first_pending_time >= self.flush_interval):
+                self.write_records(pending)
+                pending = []
+
+    def write_records(self, records):
+        if not records:
+            return
+        try:
+            conn = self.get_connection()
+            c = conn.cursor()
+            c.execute("BEGIN;")
+            for source_id, task_id, record in records:
+                # distinct increasing ctimes, so that incremental reads with LIMIT never split equal ctimes
+                ctime = max(datetime.now().timestamp(), self.last_ctime + 1e-6)
+                try:
+                    c.execute(
+                        "INSERT INTO records (source_id, task_id, ctime, json) VALUES (?, ?, ?, ?)",
+                        (source_id, task_id, ctime, record)
+                    )
+                    self.last_ctime = ctime
+                except sqlite3.IntegrityError:
+                    LOGGER.warning(f'[Task Name Conflict] source_id: {source_id}, task_id: {task_id} already exists.')
+            conn.commit()
+            self.written_records += len(records)
+        except sqlite3.Error as e:
+            LOGGER.warning(f'[Record Writer] Write {len(records)} records failed: {str(e)}')
+            LOGGER.exception(e)
+            self.close_connection()
+
+    def get_connection(self):
+        try:
+            inode = os.stat(self.record_path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if self.conn is not None and inode != self.conn_inode:
+            self.close_connection()
+        if self.conn is None:
+            self.conn = self.connect()
+            self.conn_inode = os.stat(self.record_path).st_ino
+        return self.conn
+
+    def close_connection(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except sqlite3.Error:
+                pass
+        self.conn = None
+        self.conn_inode = None
+
+    @staticmethod
+    def run_safely(func):
+        try:
+            func()
+        except Exception as e:
+            LOGGER.warning(f'[Record Writer] Execute operation failed: {str(e)}')
+            LOGGER.exception(e)
@@ -0,0 +1,117 @@
+import queue
+import threading
+import time
+
+from core.lib.content import ScenarioRecord, TaskCodec
+from core.lib.common import LOGGER, HttpRequestError
+from core.lib.network import http_request, HttpSessionPool, NetworkAPIMethod
+
+__all__ = ('ScenarioSender',)
+
+
+class ScenarioSender:
+    """
+    Sender of the scenarios of distributed tasks to the scheduler.
+    - Tasks are queued and sent by one sender thread as compact `ScenarioRecord`s,
+      in one request of every `batch_size` tasks or `flush_interval` seconds.
+    - Schedulers not serving batches of records (or if `batched` is False) are sent each serialized task
+      in a request, as before.
+    - Network errors are logged and the scenarios are dropped (no retries).
+    """
+
+    _STOP = object()
+
+    def __init__(self, scenario_address: str, batch_address: str, batched: bool = True,
+                 batch_size: int = 16, flush_interval: float = 0.05, max_queue_size: int = 10000):
+        self.scenario_address = scenario_address
+        self.batch_address = batch_address
+        self.batched = batched
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = float(flush_interval)
+
+        self.queue = queue.Queue(maxsize=max_queue_size)
+
+        self.sent_tasks = 0
+        self.sent_bytes = 0
+
+        self.thread = threading.Thread(target=self.loop_send, daemon=True)
+        self.thread.start()
+
+    def put(self, task) -> None:
+        self.queue.put(task)
+
+    def close(self, timeout=None) -> None:
+        if not self.thread.is_alive():
+            return
+        self.queue.put(self._STOP)
+        self.thread.join(timeout)
+
+    def loop_send(self):
+        pending = []
+        first_pending_time = None
+        while True:
+            wait_time = self.flush_interval - (time.time() - first_pending_time) if pending else None
+            try:
+                item = self.queue.get(timeout=max(wait_time, 0) if wait_time is not None else None)
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                self.send_tasks(pending)
+                break
+
+            if item is not None:
+                if not pending:
+                    first_pending_time = time.time()
+                pending.append(item)
+
+            if pending and (len(pending) >= self.batch_size or
+                            time.time() - first_pending_time >= self.flush_interval):
+                self.send_tasks(pending)
+                pending = []
+
+    def send_tasks(self, tasks):
+        if not tasks:
+            return
+        if self.batched and self.send_records(tasks):
+            return
+        for task in tasks:
+            self.send_task(task)
+
+    def send_records(self, tasks) -> bool:
+        """send scenario records of tasks in a request, return False if the scheduler does not serve batches"""
+        try:
+            records = [ScenarioRecord.from_task(task).to_dict() for task in tasks]
+            data = TaskCodec.get_codec(HttpSessionPool.negotiate_task_codec(self.batch_address)).encode(
+                {'records': records})
+            http_request(url=self.batch_address, method=NetworkAPIMethod.SCHEDULER_SCENARIO_BATCH,
+                         data={'data': data}, raise_error=True)
+        except HttpRequestError as e:
+            if e.status_code in (404, 405):
+                LOGGER.info('[Send Scenario] Scheduler does not serve batches of scenario records, '
+                            'fall back to sending each task.')
+                self.batched = False
+                return False
+            LOGGER.warning(f'Send scenarios of {len(tasks)} tasks to scheduler failed: {e}')
+            return True
+        except Exception as e:
+            LOGGER.warning(f'Send scenarios of {len(tasks)} tasks to scheduler failed: {e}')
+            LOGGER.exception(e)
+            return True
+
+        self.sent_tasks += len(tasks)
+        self.sent_bytes += len(data)
+        return True
+
+    def send_task(self, task):
+        try:
+            data = task.serialize(HttpSessionPool.negotiate_task_codec(self.scenario_address))
+            http_request(url=self.scenario_address, method=NetworkAPIMethod.SCHEDULER_SCENARIO,
+                         data={'data': data})
+        except Exception as e:
+            LOGGER.warning(f"Send scenario to scheduler failed: {e}")
+            LOGGER.exception(e)
+            return
+
+        self.sent_tasks += 1
+        self.sent_bytes += len(data)
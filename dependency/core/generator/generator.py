@@ -5,7 +5,7 @@ from core.lib.content import Task
 from core.lib.network import merge_address
 from core.lib.network import NodeInfo, PortInfo
 from core.lib.network import NetworkAPIPath, NetworkAPIMethod
-from core.lib.network import http_request
+from core.lib.network import http_request, HttpSessionPool
 from core.lib.estimation import TimeEstimator
 
 
@@ -97,7 +97,7 @@ class Generator:
         self.record_transmit_start_ts(cur_task)
         http_request(url=controller_address,
                      method=NetworkAPIMethod.CONTROLLER_TASK,
-                     data={'data': cur_task.serialize()},
+                     data={'data': cur_task.serialize(HttpSessionPool.negotiate_task_codec(controller_address))},
                      files={'file': (cur_task.get_file_path(),
                                      open(cur_task.get_file_path(), 'rb'),
                                      'multipart/form-data')}
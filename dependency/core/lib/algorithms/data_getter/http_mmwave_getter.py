@@ -1,6 +1,8 @@
 import abc
 import time
 import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from .base_getter import BaseDataGetter
 
@@ -13,18 +15,60 @@ __all__ = ('HttpMMWaveGetter',)
 
 @ClassFactory.register(ClassType.GEN_GETTER, alias='http_mmwave')
 class HttpMMWaveGetter(BaseDataGetter, abc.ABC):
-    def __init__(self):
+    """
+    get mmwave data (bin files) from http (fastapi), packed into a zip file per task
+
+    If `packed`, the bin files of a task are downloaded concurrently (at most `max_workers` at a time) and written
+    as they arrive into an uncompressed zip file, so that processors read the frames in place without extracting.
+    Files are ordered by the serial of the datasource (`X-Frame-Serial`), or by request order if not served.
+    Otherwise, the bin files are downloaded one at a time into a temporary directory, which is then compressed.
+    """
+
+    def __init__(self, packed: bool = True, max_workers: int = 4):
         self.file_name = None
         self.hash_codes = None
 
         self.file_suffix = 'bin'
 
+        self.packed = packed
+        self.downloader = ThreadPoolExecutor(max_workers=max(int(max_workers), 1)) if packed else None
+
     @TimeEstimator.estimate_duration_time
     def request_source_data(self, system, task_id):
         # how many bin frames per task
         buffer_size = max(int(system.meta_data.get('buffer_size', 1)),1)
         LOGGER.debug(f'Current buffer size of mmWave data: {buffer_size}')
 
+        if self.packed:
+            self.file_name = self.request_packed_files(system, task_id, buffer_size)
+        else:
+            self.file_name = self.request_zipped_files(system, task_id, buffer_size)
+
+    @staticmethod
+    def download_file(system):
+        """download a bin file, return its serial in the datasource (None if not served) and its content"""
+        while True:
+            resp = http_request(url=system.mmwave_data_source + '/file', no_decode=True)
+            if resp and resp.status_code == 200:
+                serial = resp.headers.get('X-Frame-Serial')
+                return (int(serial) if serial is not None else None), resp.content
+            time.sleep(1)
+
+    def request_packed_files(self, system, task_id, buffer_size):
+        zip_name = NameMaintainer.get_task_data_file_name(system.source_id, task_id, 'zip')
+        futures = {self.downloader.submit(self.download_file, system): index for index in range(buffer_size)}
+
+        with zipfile.ZipFile(zip_name, 'w', compression=zipfile.ZIP_STORED) as zf:
+            for future in as_completed(futures):
+                serial, content = future.result()
+                serial = futures[future] if serial is None else serial
+                # zero-padded, so that members are ordered by name
+                zf.writestr(f'frame_{serial:010d}.bin', content)
+
+        return zip_name
+
+    @staticmethod
+    def request_zipped_files(system, task_id, buffer_size):
         # Download multiple frames and zip them
         tmp_dir = f"mmwave_frames_{system.source_id}_{task_id}"
         FileOps.create_directory(tmp_dir)
@@ -35,7 +79,7 @@ class HttpMMWaveGetter(BaseDataGetter, abc.ABC):
             if not resp or resp.status_code != 200:
                 time.sleep(1)
                 continue
-            out_path = os.path.join(tmp_dir, f"frame_{downloaded}.bin")
+            out_path = os.path.join(tmp_dir, f"frame_{downloaded:010d}.bin")
             try:
                 with open(out_path, 'wb') as f:
                     for chunk in resp.iter_content(chunk_size=8192):
@@ -55,9 +99,9 @@ class HttpMMWaveGetter(BaseDataGetter, abc.ABC):
         # Create zip archive
         zip_name = NameMaintainer.get_task_data_file_name(system.source_id, task_id, 'zip')
         FileOps.zip_directory(dir_path='.', zip_name=zip_name, data_dir=tmp_dir)
-        self.file_name = zip_name
         # Clean temp dir
         FileOps.remove_file(tmp_dir)
+        return zip_name
 
     @staticmethod
     def compute_cost_time(system, cost):
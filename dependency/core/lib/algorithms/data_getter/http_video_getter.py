@@ -1,12 +1,14 @@
 import abc
+import copy
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from .base_getter import BaseDataGetter
 
 from core.lib.common import ClassFactory, ClassType, LOGGER, FileOps, Context, Counter, NameMaintainer
+from core.lib.common import DeadlinePacer, HttpRequestError
 from core.lib.network import http_request
-from core.lib.estimation import TimeEstimator
 
 __all__ = ('HttpVideoGetter',)
 
@@ -16,55 +18,110 @@ class HttpVideoGetter(BaseDataGetter, abc.ABC):
     """
     get video data from http (fastapi)
     preprocessed video data with accuracy information
+
+    A segment is fetched in a single request of `/segment` (metadata and body), falling back to
+    requests of `/source` (metadata) and `/file` (body) for datasources without it (or if `combined` is False).
+    The next segment is prefetched while the current one is submitted (if `prefetch`), with the meta data
+    decided at that time, and segments are submitted on deadlines of buffer_size / fps seconds, emulating a camera.
     """
 
-    def __init__(self):
+    def __init__(self, combined: bool = True, prefetch: bool = True):
         self.file_name = None
         self.hash_codes = None
 
         self.file_suffix = 'mp4'
 
-    @TimeEstimator.estimate_duration_time
-    def request_source_data(self, system, task_id):
+        self.combined = combined
+        self.prefetch = prefetch
+        self.prefetcher = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        self.next_segment = None
+
+        self.pacer = DeadlinePacer()
+
+    def request_source_data(self, system, task_id, meta_data):
+        """fetch a segment with the given meta data to its task data file, return its hash codes and file name"""
         data = {
             'source_id': system.source_id,
             'task_id': task_id,
-            'meta_data': system.meta_data,
+            'meta_data': meta_data,
             'raw_meta_data': system.raw_meta_data,
             'gen_filter_name': Context.get_parameter('GEN_FILTER_NAME'),
             'gen_process_name': Context.get_parameter('GEN_PROCESS_NAME'),
             'gen_compress_name': Context.get_parameter('GEN_COMPRESS_NAME')
         }
 
-        response = None
-        self.hash_codes = None
-        while not self.hash_codes or not response:
-            self.hash_codes = http_request(system.video_data_source + '/source', method='GET',
-                                           data={'data': json.dumps(data)})
-
-            if self.hash_codes:
-                response = http_request(system.video_data_source + '/file', method='GET', no_decode=True)
+        hash_codes, content = None, None
+        while not hash_codes or content is None:
+            if self.combined:
+                hash_codes, content = self.request_segment(system, data)
             else:
+                hash_codes, content = self.request_source_and_file(system, data)
+
+            if not hash_codes or content is None:
                 time.sleep(1)
 
-        self.file_name = NameMaintainer.get_task_data_file_name(system.source_id, task_id, self.file_suffix)
+        file_name = NameMaintainer.get_task_data_file_name(system.source_id, task_id, self.file_suffix)
+
+        with open(file_name, 'wb') as f:
+            f.write(content)
 
-        with open(self.file_name, 'wb') as f:
-            f.write(response.content)
+        return hash_codes, file_name
+
+    def request_segment(self, system, data):
+        try:
+            response = http_request(system.video_data_source + '/segment', method='GET',
+                                    data={'data': json.dumps(data)}, no_decode=True, raise_error=True)
+        except HttpRequestError as err:
+            if err.status_code == 404:
+                LOGGER.info(f'[Camera Simulation] source {system.source_id}: datasource does not serve segments '
+                            f'in a single request, fall back to separate requests of metadata and file.')
+                self.combined = False
+            else:
+                LOGGER.warning(f'{err}')
+            return None, None
+
+        hash_codes = json.loads(response.headers.get('X-Segment-Meta', '[]'))
+        return hash_codes, response.content
 
     @staticmethod
-    def compute_cost_time(system, cost):
-        return max(1 / system.meta_data['fps'] * system.meta_data['buffer_size'] - cost, 0)
+    def request_source_and_file(system, data):
+        hash_codes = http_request(system.video_data_source + '/source', method='GET',
+                                  data={'data': json.dumps(data)})
+        if not hash_codes:
+            return None, None
+        response = http_request(system.video_data_source + '/file', method='GET', no_decode=True)
+        return hash_codes, response.content if response else None
+
+    def fetch_segment(self, system, task_id, meta_data):
+        hash_codes, file_name = self.request_source_data(system, task_id, meta_data)
+        return task_id, meta_data, hash_codes, file_name
+
+    def start_fetch_segment(self, system):
+        # task id and meta data are taken at request time, so that prefetched segments keep their order and decisions
+        task_id = Counter.get_count('task_id')
+        meta_data = copy.deepcopy(system.meta_data)
+        if self.prefetch:
+            return self.prefetcher.submit(self.fetch_segment, system, task_id, meta_data)
+        return self.fetch_segment(system, task_id, meta_data)
+
+    @staticmethod
+    def get_segment_duration(meta_data):
+        return 1 / meta_data['fps'] * meta_data['buffer_size']
 
     def __call__(self, system):
-        new_task_id = Counter.get_count('task_id')
-        delay = self.request_source_data(system, new_task_id)
+        self.pacer.start()
+
+        segment = self.next_segment if self.next_segment is not None else self.start_fetch_segment(system)
+        self.next_segment = None
+        task_id, meta_data, self.hash_codes, self.file_name = segment.result() if self.prefetch else segment
 
-        sleep_time = self.compute_cost_time(system, delay)
+        sleep_time = self.pacer.wait(self.get_segment_duration(meta_data))
         LOGGER.info(f'[Camera Simulation] source {system.source_id}: sleep {sleep_time}s')
-        time.sleep(sleep_time)
 
-        new_task = system.generate_task(new_task_id, system.task_dag, system.meta_data, self.file_name, self.hash_codes)
+        if self.prefetch:
+            self.next_segment = self.start_fetch_segment(system)
+
+        new_task = system.generate_task(task_id, system.task_dag, meta_data, self.file_name, self.hash_codes)
         system.submit_task_to_controller(new_task)
 
         FileOps.remove_file(self.file_name)
@@ -2,6 +2,10 @@ import abc
 import threading
 import copy
 import os
+import time
+from collections import deque
+
+import numpy as np
 
 from .base_getter import BaseDataGetter
 
@@ -10,18 +14,119 @@ from core.lib.common import ClassFactory, ClassType, LOGGER, FileOps, Counter, N
 __all__ = ('RtspVideoGetter',)
 
 
+class FrameRing:
+    """
+    Preallocated ring of frames, filled frame by frame and released by chunks of consecutive frames (in any order).
+    Frames are addressed by monotonic positions, the ring is allocated on the first frame (and reallocated,
+    once empty, if the frame shape changes or a larger capacity is reserved).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.frames = None
+        # frames in [tail, head) are in use
+        self.head = 0
+        self.tail = 0
+        # chunks released before older ones: start -> end
+        self.released = {}
+        self.cond = threading.Condition()
+
+    def __len__(self):
+        with self.cond:
+            return self.head - self.tail
+
+    def is_full(self) -> bool:
+        with self.cond:
+            return self.head - self.tail >= self.capacity
+
+    def wait_free(self, timeout=None) -> bool:
+        with self.cond:
+            return self.cond.wait_for(lambda: self.head - self.tail < self.capacity, timeout)
+
+    def reserve(self, capacity: int) -> None:
+        """make sure the ring holds at least `capacity` frames, waiting for it to be empty to grow"""
+        if capacity <= self.capacity:
+            return
+        with self.cond:
+            self.cond.wait_for(lambda: self.head == self.tail)
+            self.capacity = capacity
+            self.frames = None
+
+    def get_slot(self, shape, dtype) -> np.ndarray:
+        """storage of the frame at head, to read a frame into before committing it"""
+        with self.cond:
+            if self.frames is None or self.frames.shape[1:] != shape or self.frames.dtype != dtype:
+                self.cond.wait_for(lambda: self.head == self.tail)
+                self.frames = np.empty((self.capacity,) + tuple(shape), dtype=dtype)
+            return self.frames[self.head % self.capacity]
+
+    def commit(self, frame: np.ndarray) -> int:
+        """commit the frame at head (copied unless read into its slot), return its position"""
+        with self.cond:
+            slot = self.frames[self.head % self.capacity]
+            if not np.shares_memory(slot, frame):
+                slot[...] = frame
+            self.head += 1
+            return self.head - 1
+
+    def get_frames(self, start: int, end: int) -> list:
+        """views of frames in [start, end), valid until the chunk is released"""
+        return [self.frames[position % self.capacity] for position in range(start, end)]
+
+    def release(self, start: int, end: int) -> None:
+        with self.cond:
+            if start >= end:
+                return
+            self.released[start] = end
+            while self.tail in self.released:
+                self.tail = self.released.pop(self.tail)
+            self.cond.notify_all()
+
+
 @ClassFactory.register(ClassType.GEN_GETTER, alias='rtsp_video')
 class RtspVideoGetter(BaseDataGetter, abc.ABC):
     """
     get video data from rtsp stream (in real time)
     simulate real video source, without accuracy information
+
+    Frames are read into a preallocated ring buffer, full chunks of buffer_size frames are queued (at most
+    `max_pending`) to a fixed pool of `num_workers` workers processing and compressing them, and tasks are
+    submitted in order of task id. When the workers fall behind, the `drop_policy` applies:
+      - 'block': stop reading the stream until a chunk is taken by a worker (no chunk is lost)
+      - 'drop_oldest': drop the oldest queued chunk to queue the new one (the freshest chunks are kept)
+      - 'drop_newest': drop the new chunk (the queued chunks are kept)
+    Reading also waits while the ring is full of frames held by workers (chunks are released out of order).
+    Counters of frames and chunks (captured, filtered, dropped, ...) are available from `get_counters`.
     """
 
-    def __init__(self):
+    DROP_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+    def __init__(self, num_workers: int = 2, max_pending: int = 2, drop_policy: str = 'block'):
+        assert drop_policy in self.DROP_POLICIES, \
+            f'Drop policy "{drop_policy}" not supported, supported policies: {self.DROP_POLICIES}'
         self.data_source_capture = None
-        self.frame_buffer = []
         self.file_suffix = 'mp4'
 
+        self.num_workers = max(int(num_workers), 1)
+        self.max_pending = max(int(max_pending), 1)
+        self.drop_policy = drop_policy
+
+        self.ring = FrameRing(0)
+        # start position of the chunk being read
+        self.chunk_start = None
+
+        # queued chunks of (start, end, task_dag, meta_data)
+        self.pending = deque()
+        self.pending_cond = threading.Condition()
+        # task ids are taken when workers take chunks (in queue order) and tasks are submitted in this order
+        self.next_submit_id = None
+        self.submit_cond = threading.Condition()
+        self.workers = []
+
+        self.counters_lock = threading.Lock()
+        self.counters = {'captured_frames': 0, 'filtered_frames': 0, 'queued_chunks': 0, 'submitted_chunks': 0,
+                         'failed_chunks': 0, 'dropped_chunks': 0, 'dropped_frames': 0, 'blocked_seconds': 0.0}
+
     @staticmethod
     def filter_frame(system, frame):
         return system.frame_filter(system, frame)
@@ -35,13 +140,28 @@ class RtspVideoGetter(BaseDataGetter, abc.ABC):
         assert type(frame_buffer) is list and len(frame_buffer) > 0, 'Frame buffer is not list or is empty'
         return system.frame_compress(system, frame_buffer, file_name)
 
+    def get_counters(self) -> dict:
+        with self.counters_lock:
+            return dict(self.counters)
+
+    def count(self, name, value=1):
+        with self.counters_lock:
+            self.counters[name] += value
+
+    def read_frame(self):
+        """read a frame of the stream into the ring slot at head when it fits (without allocating a frame)"""
+        if self.ring.frames is None:
+            return self.data_source_capture.read()
+        slot = self.ring.get_slot(self.ring.frames.shape[1:], self.ring.frames.dtype)
+        return self.data_source_capture.read(slot)
+
     def get_one_frame(self, system):
         import cv2
         os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = 'rtsp_transport;tcp|stimeout;5000000|rw_timeout;5000000'
         if not self.data_source_capture:
             self.data_source_capture = cv2.VideoCapture(system.video_data_source)
 
-        ret, frame = self.data_source_capture.read()
+        ret, frame = self.read_frame()
         first_no_signal = True
 
         # retry when no video signal
@@ -49,45 +169,162 @@ class RtspVideoGetter(BaseDataGetter, abc.ABC):
             if first_no_signal:
                 LOGGER.warning(f'No video signal from source {system.source_id}!')
                 first_no_signal = False
-            self.frame_buffer = []
+            self.drop_chunk_being_read()
             self.data_source_capture = cv2.VideoCapture(system.video_data_source, cv2.CAP_FFMPEG)
-            ret, frame = self.data_source_capture.read()
+            ret, frame = self.read_frame()
 
         if not first_no_signal:
             LOGGER.info(f'Get video stream data from source {system.source_id}..')
 
+        self.count('captured_frames')
         return frame
 
-    def generate_and_send_new_task(self, system, frame_buffer, new_task_id, task_dag, meta_data, ):
+    def drop_chunk_being_read(self):
+        if self.chunk_start is not None and self.ring.head > self.chunk_start:
+            self.ring.release(self.chunk_start, self.ring.head)
+            self.chunk_start = self.ring.head
+
+    def wait_ring_free(self, system):
+        """make room in the ring for one more frame according to the drop policy"""
+        while self.ring.is_full():
+            if self.drop_policy == 'drop_oldest' and self.drop_oldest_pending(system):
+                continue
+            if self.drop_policy == 'drop_newest' and self.ring.head > self.chunk_start:
+                # no chunk left to drop but the one being read
+                self.count('dropped_frames', self.ring.head - self.chunk_start)
+                self.drop_chunk_being_read()
+                continue
+            start_time = time.time()
+            self.ring.wait_free()
+            self.count('blocked_seconds', time.time() - start_time)
+
+    def drop_oldest_pending(self, system) -> bool:
+        with self.pending_cond:
+            if not self.pending:
+                return False
+            start, end, _, _ = self.pending.popleft()
+        self.ring.release(start, end)
+        self.count('dropped_chunks')
+        self.count('dropped_frames', end - start)
+        self.log_drop(system)
+        return True
+
+    def log_drop(self, system):
+        dropped = self.get_counters()['dropped_chunks']
+        if dropped == 1 or dropped % 100 == 0:
+            LOGGER.warning(f'[Frame Buffer] source {system.source_id}: workers fall behind, '
+                           f'{dropped} chunks dropped ({self.drop_policy}), counters: {self.get_counters()}')
+
+    def queue_chunk(self, system, start, end):
+        chunk = (start, end, copy.deepcopy(system.task_dag), copy.deepcopy(system.meta_data))
+        dropped = None
+        with self.pending_cond:
+            if len(self.pending) >= self.max_pending:
+                if self.drop_policy == 'drop_newest':
+                    dropped = chunk
+                    chunk = None
+                elif self.drop_policy == 'drop_oldest':
+                    dropped = self.pending.popleft()
+                else:
+                    start_time = time.time()
+                    self.pending_cond.wait_for(lambda: len(self.pending) < self.max_pending)
+                    self.count('blocked_seconds', time.time() - start_time)
+                if dropped is not None:
+                    self.ring.release(dropped[0], dropped[1])
+                    self.count('dropped_chunks')
+                    self.count('dropped_frames', dropped[1] - dropped[0])
+            if chunk is not None:
+                self.pending.append(chunk)
+                self.count('queued_chunks')
+                self.pending_cond.notify_all()
+        if dropped is not None:
+            self.log_drop(system)
+
+    def take_chunk(self):
+        with self.pending_cond:
+            self.pending_cond.wait_for(lambda: self.pending)
+            start, end, task_dag, meta_data = self.pending.popleft()
+            new_task_id = Counter.get_count('task_id')
+            if self.next_submit_id is None:
+                self.next_submit_id = new_task_id
+            self.pending_cond.notify_all()
+        return start, end, task_dag, meta_data, new_task_id
+
+    def start_workers(self, system):
+        while len(self.workers) < self.num_workers:
+            worker = threading.Thread(target=self.loop_generate_and_send_new_task, args=(system,), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def loop_generate_and_send_new_task(self, system):
+        while True:
+            start, end, task_dag, meta_data, new_task_id = self.take_chunk()
+            try:
+                self.generate_and_send_new_task(system, start, end, new_task_id, task_dag, meta_data)
+            except Exception as e:
+                self.count('failed_chunks')
+                LOGGER.warning(f'[Frame Buffer] (source {system.source_id} / task {new_task_id}) '
+                               f'generate task failed: {str(e)}')
+                LOGGER.exception(e)
+            finally:
+                self.finish_submit_turn(new_task_id)
+
+    def wait_submit_turn(self, new_task_id):
+        with self.submit_cond:
+            self.submit_cond.wait_for(lambda: self.next_submit_id == new_task_id)
+
+    def finish_submit_turn(self, new_task_id):
+        # failed tasks also wait for their turn, so that later tasks are not stuck
+        with self.submit_cond:
+            self.submit_cond.wait_for(lambda: self.next_submit_id == new_task_id)
+            self.next_submit_id += 1
+            self.submit_cond.notify_all()
+
+    def generate_and_send_new_task(self, system, start, end, new_task_id, task_dag, meta_data):
         source_id = system.source_id
 
         LOGGER.debug(f'[Frame Buffer] (source {system.source_id} / task {new_task_id}) '
-                     f'buffer size: {len(frame_buffer)}')
+                     f'buffer size: {end - start}')
 
-        frame_buffer = [
-            self.process_frame(system, frame, system.raw_meta_data['resolution'], meta_data['resolution'])
-            for frame in frame_buffer
-        ]
-        file_name = NameMaintainer.get_task_data_file_name(source_id, new_task_id, file_suffix=self.file_suffix)
-        self.compress_frames(system, frame_buffer, file_name)
+        try:
+            frame_buffer = [
+                self.process_frame(system, frame, system.raw_meta_data['resolution'], meta_data['resolution'])
+                for frame in self.ring.get_frames(start, end)
+            ]
+            file_name = NameMaintainer.get_task_data_file_name(source_id, new_task_id, file_suffix=self.file_suffix)
+            self.compress_frames(system, frame_buffer, file_name)
+        finally:
+            self.ring.release(start, end)
 
         new_task = system.generate_task(new_task_id, task_dag, meta_data, file_name, None)
+        # tasks are compressed in parallel but submitted in order of task id
+        self.wait_submit_turn(new_task_id)
         system.submit_task_to_controller(new_task)
+        self.count('submitted_chunks')
         FileOps.remove_file(file_name)
 
     def __call__(self, system):
-        while len(self.frame_buffer) < system.meta_data['buffer_size']:
+        buffer_size = system.meta_data['buffer_size']
+        # frames of chunks being compressed, queued chunks and the chunk being read
+        self.ring.reserve((self.num_workers + self.max_pending + 1) * buffer_size)
+        self.start_workers(system)
+
+        if self.chunk_start is None:
+            self.chunk_start = self.ring.head
+        while self.ring.head - self.chunk_start < buffer_size:
+            self.wait_ring_free(system)
             frame = self.get_one_frame(system)
             if self.filter_frame(system, frame):
-                self.frame_buffer.append(frame)
-
-        # generate tasks in parallel to avoid getting stuck with video compression
-        new_task_id = Counter.get_count('task_id')
-        threading.Thread(target=self.generate_and_send_new_task,
-                         args=(system,
-                               copy.deepcopy(self.frame_buffer),
-                               new_task_id,
-                               copy.deepcopy(system.task_dag),
-                               copy.deepcopy(system.meta_data),)).start()
-
-        self.frame_buffer = []
+                if self.ring.frames is None or self.ring.frames.shape[1:] != frame.shape \
+                        or self.ring.frames.dtype != frame.dtype:
+                    # (re)allocate the ring for the stream frames, once frames of another shape are released
+                    self.drop_chunk_being_read()
+                    self.ring.get_slot(frame.shape, frame.dtype)
+                self.ring.commit(frame)
+            else:
+                self.count('filtered_frames')
+
+        # generate tasks in the worker pool to avoid getting stuck with video compression
+        start, end = self.chunk_start, self.ring.head
+        self.chunk_start = end
+        self.queue_chunk(system, start, end)
@@ -1,5 +1,5 @@
 from .drl.sac_agent import SoftActorCritic
-from .drl.replay_buffer import RandomBuffer
+from .drl.replay_buffer import RandomBuffer, PrioritizedBuffer, create_replay_buffer
 from .drl.adapter import Adapter
 from .nf.negative_feedback import NegativeFeedback
 from .utils import *
@@ -1,19 +1,42 @@
+import json
+import mmap
 import numpy as np
 import torch
 import os
 
+from core.lib.common import LOGGER, FileOps
+
 
 class RandomBuffer(object):
-    def __init__(self, state_dims, action_dim, max_size=int(1e6), device='cpu', **param):
+    '''
+    Replay buffer of transitions, sampled uniformly.
+
+    The buffer is kept in RAM, or memory-mapped to `.npy` files in `buffer_dir` (if given, eg: one per agent).
+    A memory-mapped buffer is resumed from `buffer_dir` if it was checkpointed there with the same shapes.
+    `checkpoint()` syncs only the rows written since the last checkpoint, then atomically replaces the metadata
+    (pointer and size), so a crash keeps the buffer of the last checkpoint: later rows are dropped on resume
+    (only rows being overwritten by a full buffer at the crash may hold newer transitions).
+    '''
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, state_dims, action_dim, max_size=int(1e6), device='cpu', buffer_dir=None, **param):
         self.max_size = max_size
         self.ptr = 0
         self.size = 0
 
-        self.state = np.zeros((max_size, sum(state_dims[0]), state_dims[1]))
-        self.action = np.zeros((max_size, action_dim))
-        self.reward = np.zeros((max_size, 1))
-        self.next_state = np.zeros((max_size, sum(state_dims[0]), state_dims[1]))
-        self.dead = np.zeros((max_size, 1), dtype=np.uint8)
+        self.layouts = self.get_layouts(state_dims, action_dim, max_size)
+
+        self.buffer_dir = buffer_dir
+        # rows written since the last checkpoint, starting from checkpoint_ptr
+        self.checkpoint_ptr = 0
+        self.dirty_rows = 0
+
+        if buffer_dir:
+            self.open_buffer(buffer_dir)
+        else:
+            for name, (shape, dtype) in self.layouts.items():
+                setattr(self, name, np.zeros(shape, dtype=dtype))
 
         self.device = device
 
@@ -28,9 +51,21 @@ class RandomBuffer(object):
 
         self.ptr = (self.ptr + 1) % self.max_size
         self.size = min(self.size + 1, self.max_size)
+        self.dirty_rows = min(self.dirty_rows + 1, self.max_size)
 
     def sample(self, batch_size):
+        return self.sample_batch(batch_size)[0]
+
+    def sample_batch(self, batch_size):
+        '''sample transitions, with their indices and importance-sampling weights (None for uniform sampling)'''
         ind = np.random.randint(0, self.size, size=batch_size)
+        return self.get_transitions(ind), ind, None
+
+    def update_priorities(self, indices, td_errors):
+        '''uniform sampling does not use priorities'''
+        pass
+
+    def get_transitions(self, ind):
         with torch.no_grad():
             return (
                 torch.FloatTensor(self.state[ind]).to(self.device),
@@ -40,25 +75,256 @@ class RandomBuffer(object):
                 torch.FloatTensor(self.dead[ind]).to(self.device)
             )
 
-    def save(self):
+    @staticmethod
+    def get_layouts(state_dims, action_dim, max_size):
+        '''shape and dtype of each array of the buffer'''
+        return {
+            'state': ((max_size, sum(state_dims[0]), state_dims[1]), np.float64),
+            'action': ((max_size, action_dim), np.float64),
+            'reward': ((max_size, 1), np.float64),
+            'next_state': ((max_size, sum(state_dims[0]), state_dims[1]), np.float64),
+            'dead': ((max_size, 1), np.uint8),
+        }
+
+    def open_buffer(self, buffer_dir):
+        '''memory-map the buffer to buffer_dir, resuming the checkpointed buffer in it if compatible'''
+        FileOps.create_directory(buffer_dir)
+        meta = self.read_meta(buffer_dir)
+
+        layouts = self.get_layouts_meta()
+        resume = meta is not None and meta.get('layouts') == layouts and \
+            all(os.path.exists(os.path.join(buffer_dir, f'{name}.npy')) for name in self.layouts)
+        if meta is not None and not resume:
+            LOGGER.warning(f'[Replay Buffer] Buffer in {buffer_dir} does not match the current shapes, start a new one')
+
+        for name, (shape, dtype) in self.layouts.items():
+            setattr(self, name, np.lib.format.open_memmap(os.path.join(buffer_dir, f'{name}.npy'),
+                                                          mode='r+' if resume else 'w+', dtype=dtype, shape=shape))
+        if resume:
+            self.ptr, self.size = int(meta['ptr']), int(meta['size'])
+            LOGGER.info(f'[Replay Buffer] Resume buffer of {self.size} transitions from {buffer_dir}')
+        else:
+            self.ptr, self.size = 0, 0
+            self.write_meta(buffer_dir, {'ptr': 0, 'size': 0, 'layouts': layouts})
+
+        self.checkpoint_ptr = self.ptr
+        self.dirty_rows = 0
+
+    def checkpoint(self):
+        '''sync the rows written since the last checkpoint of a memory-mapped buffer, then commit its metadata'''
+        if not self.buffer_dir:
+            return
+        if self.dirty_rows:
+            # dirty rows wrap around the end of the buffer at most once
+            start, end = self.checkpoint_ptr, self.checkpoint_ptr + self.dirty_rows
+            ranges = [(start, min(end, self.max_size))]
+            if end > self.max_size:
+                ranges.append((0, end - self.max_size))
+            for name in self.layouts:
+                for range_start, range_end in ranges:
+                    self.flush_rows(getattr(self, name), range_start, range_end)
+
+        layouts = self.get_layouts_meta()
+        self.write_meta(self.buffer_dir, {'ptr': self.ptr, 'size': self.size, 'layouts': layouts})
+        self.checkpoint_ptr = self.ptr
+        self.dirty_rows = 0
+
+    def get_layouts_meta(self):
+        return {name: [list(shape), np.dtype(dtype).str] for name, (shape, dtype) in self.layouts.items()}
+
+    @staticmethod
+    def flush_rows(array, start, end):
+        mm = getattr(array, '_mmap', None)
+        if mm is None:
+            array.flush()
+            return
+        row_bytes = array.strides[0]
+        # the mapping starts at the page holding the array data
+        data_start = array.offset % mmap.ALLOCATIONGRANULARITY
+        flush_start = data_start + start * row_bytes
+        flush_start -= flush_start % mmap.ALLOCATIONGRANULARITY
+        mm.flush(flush_start, data_start + end * row_bytes - flush_start)
+
+    @classmethod
+    def read_meta(cls, buffer_dir):
+        meta_path = os.path.join(buffer_dir, cls.META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r') as f:
+                return json.load(f)
+        except ValueError as e:
+            LOGGER.warning(f'[Replay Buffer] Invalid metadata {meta_path}: {str(e)}')
+            return None
+
+    @classmethod
+    def write_meta(cls, buffer_dir, meta):
+        # replace the metadata atomically, so that it is either the old or the new one after a crash
+        meta_path = os.path.join(buffer_dir, cls.META_FILE)
+        tmp_path = f'{meta_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, meta_path)
+
+    def save(self, buffer_dir='buffer'):
         '''save the replay buffer if you want'''
+        FileOps.create_directory(buffer_dir)
         scaller = np.array([self.max_size, self.ptr, self.size], dtype=np.uint32)
-        np.save("buffer/scaller.npy", scaller)
-        np.save("buffer/state.npy", self.state)
-        np.save("buffer/action.npy", self.action)
-        np.save("buffer/reward.npy", self.reward)
-        np.save("buffer/next_state.npy", self.next_state)
-        np.save("buffer/dead.npy", self.dead)
-
-    def load(self):
-        scaller = np.load("buffer/scaller.npy")
-
-        self.max_size = scaller[0]
-        self.ptr = scaller[1]
-        self.size = scaller[2]
-
-        self.state = np.load("buffer/state.npy")
-        self.action = np.load("buffer/action.npy")
-        self.reward = np.load("buffer/reward.npy")
-        self.next_state = np.load("buffer/next_state.npy")
-        self.dead = np.load("buffer/dead.npy")
+        np.save(os.path.join(buffer_dir, 'scaller.npy'), scaller)
+        for name in self.layouts:
+            np.save(os.path.join(buffer_dir, f'{name}.npy'), getattr(self, name))
+
+    def load(self, buffer_dir='buffer'):
+        scaller = np.load(os.path.join(buffer_dir, 'scaller.npy'))
+
+        self.max_size = int(scaller[0])
+        self.ptr = int(scaller[1])
+        self.size = int(scaller[2])
+
+        for name in self.layouts:
+            if self.buffer_dir:
+                # keep the memory-mapped buffer, all of whose rows are then written at the next checkpoint
+                getattr(self, name)[:] = np.load(os.path.join(buffer_dir, f'{name}.npy'))
+            else:
+                setattr(self, name, np.load(os.path.join(buffer_dir, f'{name}.npy')))
+        if self.buffer_dir:
+            self.checkpoint_ptr, self.dirty_rows = 0, self.max_size
+
+
+class SumTree(object):
+    '''
+    Binary tree of priorities whose inner nodes hold the sums of their children,
+    so that a priority is updated and a prefix sum is searched in O(log n).
+    Leaves are at [leaf_start, leaf_start + capacity) of a complete tree padded to a power of 2.
+    '''
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.leaf_start = 1 << max(int(capacity - 1).bit_length(), 1)
+        self.tree = np.zeros(2 * self.leaf_start, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def get(self, indices):
+        return self.tree[self.leaf_start + np.asarray(indices)]
+
+    def update_one(self, index, priority):
+        node = self.leaf_start + int(index)
+        tree = self.tree
+        change = priority - tree[node]
+        while node >= 1:
+            tree[node] += change
+            node >>= 1
+
+    def update(self, indices, priorities):
+        nodes = self.leaf_start + np.asarray(indices, dtype=np.int64)
+        self.tree[nodes] = priorities
+        # recompute the sums of the ancestors level by level (duplicated indices keep their last priority)
+        while nodes[0] > 1:
+            nodes = np.unique(nodes >> 1)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def build(self, priorities):
+        '''set the leaves from the start to priorities and rebuild all sums in O(n)'''
+        self.tree[:] = 0
+        self.tree[self.leaf_start: self.leaf_start + len(priorities)] = priorities
+        start = self.leaf_start
+        while start > 1:
+            start >>= 1
+            self.tree[start: 2 * start] = self.tree[2 * start: 4 * start: 2] + self.tree[2 * start + 1: 4 * start: 2]
+
+    def find(self, values):
+        '''indices of the leaves whose prefix sums cover values (all searched at once)'''
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.leaf_start:
+            left = 2 * nodes
+            left_sums = self.tree[left]
+            go_right = values > left_sums
+            values -= np.where(go_right, left_sums, 0)
+            nodes = left + go_right
+        return nodes - self.leaf_start
+
+
+class PrioritizedBuffer(RandomBuffer):
+    '''
+    Replay buffer of transitions, sampled in proportion to their priorities (|TD error| + per_epsilon) ** per_alpha.
+    New transitions get the maximum priority so far, so they are sampled at least once soon.
+    Sampling bias is corrected by importance-sampling weights (size * probability) ** -beta, normalized by their
+    maximum, with beta annealed from per_beta to 1 over per_beta_steps samples.
+    Priorities are stored as an array of the buffer, so they are memory-mapped and checkpointed with it.
+    '''
+
+    def __init__(self, state_dims, action_dim, max_size=int(1e6), device='cpu', buffer_dir=None,
+                 per_alpha=0.6, per_beta=0.4, per_beta_steps=int(1e5), per_epsilon=1e-6, **param):
+        self.alpha = per_alpha
+        self.beta = per_beta
+        self.beta_increment = (1 - per_beta) / max(per_beta_steps, 1)
+        self.epsilon = per_epsilon
+
+        super().__init__(state_dims, action_dim, max_size=max_size, device=device, buffer_dir=buffer_dir, **param)
+
+        self.tree = SumTree(self.max_size)
+        self.rebuild_tree()
+
+    @staticmethod
+    def get_layouts(state_dims, action_dim, max_size):
+        layouts = RandomBuffer.get_layouts(state_dims, action_dim, max_size)
+        layouts['priority'] = ((max_size,), np.float64)
+        return layouts
+
+    def rebuild_tree(self):
+        self.tree.build(self.priority[:self.size])
+        self.max_priority = float(self.priority[:self.size].max()) if self.size else 1.0
+
+    def add(self, state, action, reward, next_state, dead):
+        ptr = self.ptr
+        self.priority[ptr] = self.max_priority
+        self.tree.update_one(ptr, self.max_priority)
+        super().add(state, action, reward, next_state, dead)
+
+    def sample_batch(self, batch_size):
+        # one sample from each of batch_size equal segments of the total priority
+        total = self.tree.total
+        values = (np.arange(batch_size) + np.random.random_sample(batch_size)) * (total / batch_size)
+        ind = np.minimum(self.tree.find(np.minimum(values, total)), self.size - 1)
+
+        probs = self.tree.get(ind) / total
+        weights = (self.size * probs) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(self.beta + self.beta_increment, 1.0)
+
+        with torch.no_grad():
+            weights = torch.FloatTensor(weights).unsqueeze(-1).to(self.device)
+        return self.get_transitions(ind), ind, weights
+
+    def update_priorities(self, indices, td_errors):
+        priorities = (np.abs(np.asarray(td_errors, dtype=np.float64)) + self.epsilon) ** self.alpha
+        self.priority[indices] = priorities
+        self.tree.update(indices, priorities)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+    def checkpoint(self):
+        # priorities are updated anywhere in the buffer, not only in the newly written rows
+        if self.buffer_dir:
+            self.priority.flush()
+        super().checkpoint()
+
+    def load(self, buffer_dir='buffer'):
+        super().load(buffer_dir)
+        self.tree = SumTree(self.max_size)
+        self.rebuild_tree()
+
+
+def create_replay_buffer(replay_buffer='random', **params):
+    '''create the replay buffer selected by `replay_buffer` of the drl parameters ('random' or 'prioritized')'''
+    if replay_buffer == 'random':
+        return RandomBuffer(**params)
+    elif replay_buffer == 'prioritized':
+        return PrioritizedBuffer(**params)
+    else:
+        raise ValueError(f'Invalid replay buffer type: {replay_buffer}')
@@ -69,7 +69,8 @@ class SoftActorCritic(object):
         return a.cpu().numpy().flatten()
 
     def train(self, replay_buffer):
-        s, a, r, s_prime, dead_mask = replay_buffer.sample(self.batch_size)
+        # weights are None for uniformly sampled transitions
+        (s, a, r, s_prime, dead_mask), ind, weights = replay_buffer.sample_batch(self.batch_size)
 
         # ----------------------------- ↓↓↓↓↓ Update Q Net ↓↓↓↓↓ ------------------------------#
         with torch.no_grad():
@@ -82,11 +83,20 @@ class SoftActorCritic(object):
         # Get current Q estimates
         current_Q1, current_Q2 = self.q_critic(s, a)
 
-        q_loss = F.mse_loss(current_Q1, target_Q) + F.mse_loss(current_Q2, target_Q)
+        if weights is None:
+            q_loss = F.mse_loss(current_Q1, target_Q) + F.mse_loss(current_Q2, target_Q)
+        else:
+            # importance-sampling weights correct the bias of prioritized sampling
+            q_loss = (weights * ((current_Q1 - target_Q) ** 2 + (current_Q2 - target_Q) ** 2)).mean()
         self.q_critic_optimizer.zero_grad()
         q_loss.backward()
         self.q_critic_optimizer.step()
 
+        if weights is not None:
+            with torch.no_grad():
+                td_errors = ((current_Q1 - target_Q).abs() + (current_Q2 - target_Q).abs()) / 2
+            replay_buffer.update_priorities(ind, td_errors.cpu().numpy().reshape(-1))
+
         # ----------------------------- ↓↓↓↓↓ Update Actor Net ↓↓↓↓↓ ------------------------------#
         # Freeze Q-networks so you don't waste computational effort
         # computing gradients for them during the policy learning step.
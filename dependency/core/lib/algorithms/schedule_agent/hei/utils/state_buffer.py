@@ -1,104 +1,148 @@
+import logging
+import threading
+
 import numpy as np
 from core.lib.common import LOGGER
 
 
+class RingBuffer:
+    """
+    Fixed-capacity buffer of equal-length numeric rows, preallocated on the first row.
+    Each row is written twice (at position and position + capacity), so that the latest rows
+    are always a contiguous view of the storage without copying.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = None
+        self.pos = 0
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def append(self, row):
+        row = np.asarray(row, dtype=np.float64).reshape(-1)
+        if self.data is None:
+            self.data = np.empty((2 * self.capacity, row.size), dtype=np.float64)
+        self.data[self.pos] = row
+        self.data[self.pos + self.capacity] = row
+        self.pos = (self.pos + 1) % self.capacity
+        self.length = min(self.length + 1, self.capacity)
+
+    def view(self):
+        """the rows from the oldest to the latest, as a view of the storage"""
+        if self.data is None:
+            return np.empty((0, 0), dtype=np.float64)
+        end = self.pos + self.capacity
+        return self.data[end - self.length: end]
+
+
 class StateBuffer:
     def __init__(self, window_size):
-        self.resources = []
-        self.scenarios = []
-        self.decisions = []
-        self.tasks = []
-
         self.window_size = window_size
         self.max_size = window_size*2
 
+        self.resources = RingBuffer(self.max_size)
+        self.scenarios = RingBuffer(self.max_size)
+        self.decisions = RingBuffer(self.max_size)
+        self.tasks = []
+
+        # resample indices of each buffer length
+        self.resample_indices = {}
+
+        self.lock = threading.Lock()
+
     def add_resource_buffer(self, resource):
-        self.resources.append(resource)
-        while len(self.resources) > self.max_size:
-            self.resources.pop(0)
+        with self.lock:
+            self.resources.append(resource)
 
     def add_scenario_buffer(self, scenario):
-        self.scenarios.append(scenario)
-        while len(self.scenarios) > self.max_size:
-            self.scenarios.pop(0)
+        with self.lock:
+            self.scenarios.append(scenario)
 
     def add_decision_buffer(self, decision):
-        self.decisions.append(decision)
-        while len(self.decisions) > self.max_size:
-            self.decisions.pop(0)
+        with self.lock:
+            self.decisions.append(decision)
 
     def add_task_buffer(self, task):
-        self.tasks.append(task)
+        with self.lock:
+            self.tasks.append(task)
 
     def get_resource_buffer(self):
-        return np.array(self.resources.copy())
+        with self.lock:
+            return self.resources.view().copy()
 
     def get_scenario_buffer(self):
-        return np.array(self.scenarios.copy())
+        with self.lock:
+            return self.scenarios.view().copy()
 
     def get_decision_buffer(self):
-        return np.array(self.decisions.copy())
+        with self.lock:
+            return self.decisions.view().copy()
 
     def get_task_buffer(self):
-        return np.array(self.tasks.copy())
+        with self.lock:
+            return np.array(self.tasks.copy())
 
     def get_state_buffer(self):
 
-        resources = self.resources.copy()
-        scenarios = self.scenarios.copy()
-        decisions = self.decisions.copy()
-        tasks = self.tasks.copy()
+        with self.lock:
+            tasks = self.tasks.copy()
+
+            if len(self.resources) == 0 or len(self.scenarios) == 0 or len(self.decisions) == 0:
+                resources = scenarios = decisions = None
+            else:
+                # resampling copies the rows out of the ring views, so the state is not changed by later updates
+                resources = self.resample(self.resources.view())
+                scenarios = self.resample(self.scenarios.view())
+                decisions = self.resample(self.decisions.view())
+
+            self.clear_state_buffer()
 
         if len(tasks) == 0:
             evaluation_info = None
         else:
             evaluation_info = tasks
 
-        if len(resources) == 0 or len(scenarios) == 0 or len(decisions) == 0:
+        if resources is None:
             state = None
         else:
-
-            LOGGER.debug(f'[Resource Buffer] length: {len(resources)}, content: {resources}')
-            LOGGER.debug(f'[Scenario Buffer] length: {len(scenarios)}, content: {scenarios}')
-            LOGGER.debug(f'[Decision Buffer] length: {len(decisions)}, content: {decisions}')
-
-            resources = np.array(self.resample_buffer(resources, self.window_size))
-            scenarios = np.array(self.resample_buffer(scenarios, self.window_size))
-            decisions = np.array(self.resample_buffer(decisions, self.window_size))
-
-            LOGGER.debug(f'[Resample Resource Buffer] length: {len(resources)}, content: {resources}')
-            LOGGER.debug(f'[Resample Scenario Buffer] length: {len(scenarios)}, content: {scenarios}')
-            LOGGER.debug(f'[Resample Decision Buffer] length: {len(decisions)}, content: {decisions}')
-
             state = np.vstack((resources.T, scenarios.T, decisions.T))
-            LOGGER.debug(f'[State Buffer] content: {state}')
 
-        self.clear_state_buffer()
+            # formatting the buffers costs more than building the state
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug(f'[Resample Resource Buffer] length: {len(resources)}, content: {resources}')
+                LOGGER.debug(f'[Resample Scenario Buffer] length: {len(scenarios)}, content: {scenarios}')
+                LOGGER.debug(f'[Resample Decision Buffer] length: {len(decisions)}, content: {decisions}')
+                LOGGER.debug(f'[State Buffer] content: {state}')
+
         return state, evaluation_info
 
     def clear_state_buffer(self):
-        # self.resources.clear()
-        # self.scenarios.clear()
-        # self.decisions.clear()
         self.tasks.clear()
 
+    def resample(self, rows):
+        length = len(rows)
+        if length not in self.resample_indices:
+            self.resample_indices[length] = self.get_resample_indices(length, self.window_size)
+        return rows[self.resample_indices[length]]
+
     @staticmethod
-    def resample_buffer(buffer, size):
-        buffer_length = len(buffer)
+    def get_resample_indices(buffer_length, size):
+        """indices of the buffer taken by `resample_buffer`"""
         assert buffer_length != 0, 'Resample buffer size is 0!'
 
         if buffer_length > size:
-            indices = np.linspace(0, buffer_length - 1, num=size, dtype=int)
-            resized_buffer = [buffer[idx] for idx in indices]
+            return np.linspace(0, buffer_length - 1, num=size, dtype=int)
         elif buffer_length < size:
-            resized_buffer = []
-            repeat_factor = size // buffer_length
-            extra_slots = size % buffer_length
-            for i in range(buffer_length):
-                resized_buffer.extend([buffer[i]] * repeat_factor)
-                if extra_slots > 0:
-                    resized_buffer.append(buffer[i])
-                    extra_slots -= 1
+            # each item is repeated size // buffer_length times, the first size % buffer_length items once more
+            counts = np.full(buffer_length, size // buffer_length)
+            counts[:size % buffer_length] += 1
+            return np.repeat(np.arange(buffer_length), counts)
         else:
-            resized_buffer = buffer[:]
-        return resized_buffer
+            return np.arange(buffer_length)
+
+    @staticmethod
+    def resample_buffer(buffer, size):
+        return [buffer[idx] for idx in StateBuffer.get_resample_indices(len(buffer), size)]
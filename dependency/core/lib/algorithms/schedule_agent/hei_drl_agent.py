@@ -27,10 +27,11 @@ class HEIDRLAgent(BaseAgent, abc.ABC):
                  punishment_coefficient: float = 20,
                  punishment_bound: float = -2,
                  reward_bound: float = 0.5,
-                 reward_coefficient: float = 0.3, ):
+                 reward_coefficient: float = 0.3,
+                 replay_buffer_dir: str = '', ):
         super().__init__()
 
-        from .hei import SoftActorCritic, RandomBuffer, Adapter, StateBuffer
+        from .hei import SoftActorCritic, create_replay_buffer, Adapter, StateBuffer
 
         self.agent_id = agent_id
         self.system = system
@@ -50,7 +51,11 @@ class HEIDRLAgent(BaseAgent, abc.ABC):
         self.reward_coefficient = reward_coefficient
 
         self.drl_agent = SoftActorCritic(**drl_params)
-        self.replay_buffer = RandomBuffer(**drl_params)
+        # replay buffer ('replay_buffer' of drl parameters: random / prioritized) is memory-mapped
+        # to a directory of each agent (resumed after restarts) if replay_buffer_dir is set
+        buffer_dir = Context.get_file_path(os.path.join('scheduler/hei-drl', replay_buffer_dir, f'agent_{agent_id}')) \
+            if replay_buffer_dir else None
+        self.replay_buffer = create_replay_buffer(**dict(drl_params, buffer_dir=buffer_dir))
         self.adapter = Adapter
 
         self.fps_list = system.fps_list
@@ -220,10 +225,12 @@ class HEIDRLAgent(BaseAgent, abc.ABC):
 
             if step % self.save_interval == 0:
                 self.drl_agent.save(self.model_dir, step)
+                self.replay_buffer.checkpoint()
 
             if done:
                 state = self.reset_drl_env()
 
+        self.replay_buffer.checkpoint()
         LOGGER.info(f'[DRL Train] (agent {self.agent_id}) End train drl agent ..')
 
     def inference_drl_agent(self):
@@ -2,7 +2,11 @@ import abc
 
 
 class BaseQueue(metaclass=abc.ABCMeta):
-    def get(self):
+    def get(self, block=False, timeout=None):
+        """
+        pop a task from the queue, return None if no task is available.
+        if `block` is set, wait (at most `timeout` seconds) until a task arrives.
+        """
         raise NotImplementedError
 
     def size(self):
@@ -14,10 +14,13 @@ class LimitQueue(BaseQueue, abc.ABC):
     def __init__(self, max_size):
         self._queue = Queue()
         self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
         self.max_size = max_size
 
-    def get(self):
+    def get(self, block=False, timeout=None):
         with self.lock:
+            if block:
+                self.not_empty.wait_for(lambda: not self._queue.empty(), timeout=timeout)
             if self._queue.empty():
                 return None
             return self._queue.get()
@@ -27,7 +30,8 @@ class LimitQueue(BaseQueue, abc.ABC):
             if self.size() > self.max_size:
                 for _ in range(self.size()//2):
                     self._queue.get()
-                self._queue.put(task)
+            self._queue.put(task)
+            self.not_empty.notify()
 
     def size(self) -> int:
         return self._queue.qsize()
@@ -14,6 +14,7 @@ class PriorityQueue(BaseQueue, abc.ABC):
     def __init__(self):
         self._queue = PQ()
         self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
 
         self._MAX_SIZE = 10
 
@@ -23,9 +24,12 @@ class PriorityQueue(BaseQueue, abc.ABC):
             # Retrieve the priority to trigger priority calculation
             priority = task.priority
             self._queue.put(task)
+            self.not_empty.notify()
 
-    def get(self):
+    def get(self, block=False, timeout=None):
         with self.lock:
+            if block:
+                self.not_empty.wait_for(lambda: not self._queue.empty(), timeout=timeout)
             if self._queue.empty():
                 return None
             task = self._queue.get()
@@ -14,9 +14,12 @@ class SimpleQueue(BaseQueue, abc.ABC):
     def __init__(self):
         self._queue = Queue()
         self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
 
-    def get(self):
+    def get(self, block=False, timeout=None):
         with self.lock:
+            if block:
+                self.not_empty.wait_for(lambda: not self._queue.empty(), timeout=timeout)
             if self._queue.empty():
                 return None
             return self._queue.get()
@@ -24,6 +27,7 @@ class SimpleQueue(BaseQueue, abc.ABC):
     def put(self, task: Task) -> None:
         with self.lock:
             self._queue.put(task)
+            self.not_empty.notify()
 
     def size(self) -> int:
         return self._queue.qsize()
@@ -1,2 +1,18 @@
 class FileNotMountedError(Exception):
     pass
+
+
+class HttpRequestError(Exception):
+    CONNECTION = 'connection'
+    TIMEOUT = 'timeout'
+    REQUEST = 'request'
+    STATUS = 'status'
+    DECODE = 'decode'
+    UNKNOWN = 'unknown'
+
+    def __init__(self, category: str, url: str, detail=None, status_code: int = None):
+        self.category = category
+        self.url = url
+        self.detail = detail
+        self.status_code = status_code
+        super().__init__(f'[{category} error] request {url}: {detail}')
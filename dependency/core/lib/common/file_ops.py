@@ -1,6 +1,8 @@
 import os
 import shutil
+import struct
 import tempfile
+import zipfile
 
 
 class FileOps:
@@ -82,3 +84,29 @@ class FileOps:
         FileOps.create_directory(extract_dir)
         shutil.unpack_archive(zip_path, extract_dir, 'zip')
 
+
+    @staticmethod
+    def locate_stored_zip_members(zip_path):
+        """
+        Locate the data of the members of a .zip file stored without compression,
+        so that they can be read in place without extracting.
+
+        Args:
+            zip_path: Path to the .zip file.
+
+        Returns:
+            List of (member name, byte offset of its data in the .zip file, byte size of its data),
+            or None if any member is compressed.
+        """
+        members = []
+        with open(zip_path, 'rb') as f, zipfile.ZipFile(f) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                if info.compress_type != zipfile.ZIP_STORED:
+                    return None
+                # data follows the local file header, whose name and extra fields may differ from the central directory
+                f.seek(info.header_offset)
+                header = struct.unpack('<4s2B4HL2L2H', f.read(30))
+                members.append((info.filename, info.header_offset + 30 + header[10] + header[11], info.file_size))
+        return members
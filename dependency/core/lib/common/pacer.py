@@ -0,0 +1,37 @@
+import time
+
+
+class DeadlinePacer:
+    """
+    Pace periodic work on absolute deadlines, each one `period` seconds after the previous one,
+    so that the time spent between waits (and sleep overshoot) does not accumulate as drift.
+    When the work falls behind its deadline by more than `max_lag` periods, deadlines restart from now
+    instead of bursting to catch up.
+    """
+
+    def __init__(self, max_lag: float = 1.0, clock=time.monotonic, sleep=time.sleep):
+        self.max_lag = max_lag
+        self.clock = clock
+        self.sleep = sleep
+        self.deadline = None
+
+    def start(self) -> None:
+        """anchor the deadlines at now (only if not started yet)"""
+        if self.deadline is None:
+            self.deadline = self.clock()
+
+    def reset(self) -> None:
+        self.deadline = None
+
+    def wait(self, period: float) -> float:
+        """wait until the deadline `period` seconds after the previous one, return the waited seconds"""
+        self.start()
+        self.deadline += period
+        now = self.clock()
+        delay = self.deadline - now
+        if delay > 0:
+            self.sleep(delay)
+            return delay
+        if -delay > self.max_lag * period:
+            self.deadline = now
+        return 0.0
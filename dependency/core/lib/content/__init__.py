@@ -1,3 +1,5 @@
 from .task import Task
 from .service import Service
 from .dag import DAG
+from .codec import TaskCodec
+from .scenario_record import ScenarioRecord
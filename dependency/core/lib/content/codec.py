@@ -0,0 +1,161 @@
+import base64
+import json
+import sys
+from array import array
+
+
+class TaskCodec:
+    """
+    Wire format of serialized tasks.
+
+    Payloads are kept as text (they travel in form fields and redis hashes) and each non-json codec marks its
+    payload with a unique prefix, so that `TaskCodec.decode_any` can always recognize the format of incoming data.
+    """
+
+    name = None
+    prefix = ''
+
+    def encode(self, data: dict) -> str:
+        raise NotImplementedError
+
+    def decode(self, data: str) -> dict:
+        raise NotImplementedError
+
+    @staticmethod
+    def get_codec(name: str = None) -> 'TaskCodec':
+        name = name or JsonTaskCodec.name
+        if name not in TASK_CODECS:
+            raise ValueError(f'Task codec "{name}" not supported, supported codecs: {list(TASK_CODECS)}')
+        return TASK_CODECS[name]
+
+    @staticmethod
+    def detect_codec(data: str) -> 'TaskCodec':
+        for codec in TASK_CODECS.values():
+            if codec.prefix and data.startswith(codec.prefix):
+                return codec
+        return TASK_CODECS[JsonTaskCodec.name]
+
+    @staticmethod
+    def decode_any(data: str) -> dict:
+        return TaskCodec.detect_codec(data).decode(data)
+
+    @staticmethod
+    def get_supported_codecs() -> list:
+        return list(TASK_CODECS)
+
+
+class JsonTaskCodec(TaskCodec):
+    name = 'json'
+
+    def encode(self, data: dict) -> str:
+        return json.dumps(data)
+
+    def decode(self, data: str) -> dict:
+        return json.loads(data)
+
+
+class BinaryTaskCodec(TaskCodec):
+    """
+    Compact codec storing numeric arrays (eg: bounding boxes of all frames) as packed little-endian buffers.
+
+    Payload: '{prefix}{skeleton length}:{json skeleton}{base64 of packed buffers}'.
+    Rectangular lists of ints (int64) or floats (float64) are replaced in the skeleton by
+    {'$nd': [offset, typecode, shape]} pointing into the buffers, user dicts holding a reserved key are escaped as
+    {'$esc': [[key, value], ...]}. Decoding yields exactly what the json codec yields (tuples become lists and
+    non-string keys become strings).
+    """
+
+    name = 'binary'
+    prefix = 'dayu-bin1:'
+
+    ARRAY_KEY = '$nd'
+    ESCAPE_KEY = '$esc'
+    # shorter numeric lists are cheaper to keep inline in the skeleton
+    MIN_ARRAY_SIZE = 8
+
+    def encode(self, data: dict) -> str:
+        buffers = bytearray()
+        skeleton = json.dumps(self._pack(data, buffers), separators=(',', ':'))
+        return f'{self.prefix}{len(skeleton)}:{skeleton}{base64.b64encode(buffers).decode("ascii")}'
+
+    def decode(self, data: str) -> dict:
+        data = data[len(self.prefix):]
+        length, data = data.split(':', 1)
+        skeleton, buffers = data[:int(length)], base64.b64decode(data[int(length):])
+        return json.loads(skeleton, object_hook=lambda obj: self._unpack(obj, buffers))
+
+    def _pack(self, obj, buffers: bytearray):
+        if isinstance(obj, dict):
+            packed = {key: self._pack(value, buffers) for key, value in obj.items()}
+            if self.ARRAY_KEY in obj or self.ESCAPE_KEY in obj:
+                return {self.ESCAPE_KEY: [[key if isinstance(key, str) else json.dumps(key), value]
+                                          for key, value in packed.items()]}
+            return packed
+        if isinstance(obj, (list, tuple)):
+            packed = self._pack_array(obj, buffers)
+            if packed is not None:
+                return packed
+            return [self._pack(item, buffers) for item in obj]
+        return obj
+
+    def _pack_array(self, obj, buffers: bytearray):
+        shape = []
+        level = obj
+        while isinstance(level, (list, tuple)):
+            shape.append(len(level))
+            if not level:
+                return None
+            level = level[0]
+
+        size = 1
+        for dim in shape:
+            size *= dim
+        if size < self.MIN_ARRAY_SIZE:
+            return None
+
+        flat = obj
+        for dim in shape[1:]:
+            if not all(isinstance(item, (list, tuple)) and len(item) == dim for item in flat):
+                return None
+            flat = [value for item in flat for value in item]
+
+        if all(isinstance(value, float) for value in flat):
+            typecode = 'd'
+        elif all(isinstance(value, int) and not isinstance(value, bool) for value in flat):
+            typecode = 'q'
+        else:
+            return None
+
+        try:
+            packed = array(typecode, flat)
+        except (OverflowError, TypeError):
+            return None
+        if sys.byteorder == 'big':
+            packed.byteswap()
+
+        offset = len(buffers)
+        buffers.extend(packed.tobytes())
+        return {self.ARRAY_KEY: [offset, typecode, shape]}
+
+    def _unpack(self, obj: dict, buffers: bytes):
+        if len(obj) != 1:
+            return obj
+        if self.ESCAPE_KEY in obj:
+            return dict(obj[self.ESCAPE_KEY])
+        if self.ARRAY_KEY in obj:
+            offset, typecode, shape = obj[self.ARRAY_KEY]
+            size = 1
+            for dim in shape:
+                size *= dim
+            unpacked = array(typecode)
+            unpacked.frombytes(buffers[offset: offset + size * unpacked.itemsize])
+            if sys.byteorder == 'big':
+                unpacked.byteswap()
+            values = unpacked.tolist()
+            for dim in reversed(shape[1:]):
+                values = [values[i: i + dim] for i in range(0, len(values), dim)]
+            return values
+        return obj
+
+
+TASK_CODECS = {codec.name: codec for codec in (JsonTaskCodec(), BinaryTaskCodec())}
@@ -1,4 +1,3 @@
-import copy
 import json
 import heapq
 from typing import List
@@ -30,6 +29,9 @@ class Node:
     def add_prev_node(self, prev_node: Service):
         self.prev_nodes.append(prev_node.get_service_name())
 
+    def fork(self) -> 'Node':
+        return Node(self.service.fork(), list(self.prev_nodes), list(self.next_nodes))
+
     def to_dict(self):
         return {
             "service": Service.to_dict(self.service),
@@ -67,7 +69,7 @@ class DAG:
         return self.nodes[service_name]
 
     def set_node_service(self, service_name: str, service: Service):
-        self.get_node(service_name).service = copy.deepcopy(service)
+        self.get_node(service_name).service = service.fork()
 
     def get_next_nodes(self, service_name: str) -> List[Service]:
         if service_name not in self.nodes:
@@ -297,6 +299,12 @@ class DAG:
                         f"but {parent_name} doesn't list {service_name} as child"
                     )
 
+    def fork(self) -> 'DAG':
+        """copy of the dag for a forked task, see `Service.fork`"""
+        dag = DAG()
+        dag.nodes = {service_name: node.fork() for service_name, node in self.nodes.items()}
+        return dag
+
     def to_dict(self):
         dag_dict = {}
         for service_name, node in self.nodes.items():
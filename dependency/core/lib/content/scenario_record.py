@@ -0,0 +1,121 @@
+from .task import Task
+
+from core.lib.common import NameMaintainer
+
+
+class ScenarioRecord:
+    """
+    Compact record of a completed task with what schedulers consume from it,
+    reading like the `Task` it is extracted from (for scenario / policy extraction and scheduler agents).
+    - Delays are calculated at extraction, so the DAG is kept only as its deployment (without service contents
+      and execution data) and only the content of the first service is kept.
+    - Time tickets of the task are dropped from its temporary data.
+    """
+
+    def __init__(self, source_id: int, task_id: int, source_device: str,
+                 meta_data: dict = None, raw_meta_data: dict = None, scenario_data: dict = None,
+                 tmp_data: dict = None, hash_data: list = None, first_content=None, dag_deployment: dict = None,
+                 total_time: float = None, cloud_edge_transmit_time: float = None):
+        self.__source_id = source_id
+        self.__task_id = task_id
+        self.__source_device = source_device
+        self.__metadata = meta_data
+        self.__raw_metadata = raw_meta_data
+        self.__scenario_data = scenario_data if scenario_data else {}
+        self.__tmp_data = tmp_data if tmp_data else {}
+        self.__hash_data = hash_data if hash_data else []
+        self.__first_content = first_content
+        self.__dag_deployment = dag_deployment
+        self.__total_time = total_time
+        self.__cloud_edge_transmit_time = cloud_edge_transmit_time
+
+        self.__dag_flow = None
+
+    @classmethod
+    def from_task(cls, task: Task) -> 'ScenarioRecord':
+        tag_prefix = NameMaintainer.get_time_ticket_tag_prefix(task)
+        return cls(source_id=task.get_source_id(),
+                   task_id=task.get_task_id(),
+                   source_device=task.get_source_device(),
+                   meta_data=task.get_metadata(),
+                   raw_meta_data=task.get_raw_metadata(),
+                   scenario_data=task.get_scenario_data(),
+                   tmp_data={key: value for key, value in task.get_tmp_data().items()
+                             if not key.startswith(tag_prefix)},
+                   hash_data=task.get_hash_data(),
+                   first_content=task.get_first_content(),
+                   dag_deployment=task.get_dag_deployment_info(),
+                   total_time=cls.calculate_safely(task.calculate_total_time),
+                   cloud_edge_transmit_time=cls.calculate_safely(task.calculate_cloud_edge_transmit_time))
+
+    @staticmethod
+    def calculate_safely(func):
+        # delays of incomplete tasks are not available, as calculated from the task
+        try:
+            return func()
+        except (AssertionError, ValueError):
+            return None
+
+    def get_source_id(self):
+        return self.__source_id
+
+    def get_task_id(self):
+        return self.__task_id
+
+    def get_source_device(self):
+        return self.__source_device
+
+    def get_metadata(self):
+        return self.__metadata
+
+    def get_raw_metadata(self):
+        return self.__raw_metadata
+
+    def get_scenario_data(self):
+        return self.__scenario_data
+
+    def get_tmp_data(self):
+        return self.__tmp_data
+
+    def get_hash_data(self):
+        return self.__hash_data
+
+    def get_first_content(self):
+        return self.__first_content
+
+    def get_dag_deployment_info(self):
+        return self.__dag_deployment
+
+    def get_dag(self):
+        if self.__dag_flow is None and self.__dag_deployment:
+            self.__dag_flow = Task.extract_dag_from_dag_deployment(self.__dag_deployment)
+        return self.__dag_flow
+
+    def calculate_total_time(self):
+        assert self.__total_time is not None, f'Total time of task {self.__task_id} is not available'
+        return self.__total_time
+
+    def calculate_cloud_edge_transmit_time(self):
+        assert self.__cloud_edge_transmit_time is not None, \
+            f'Cloud-edge transmit time of task {self.__task_id} is not available'
+        return self.__cloud_edge_transmit_time
+
+    def to_dict(self):
+        return {
+            'source_id': self.__source_id,
+            'task_id': self.__task_id,
+            'source_device': self.__source_device,
+            'meta_data': self.__metadata,
+            'raw_meta_data': self.__raw_metadata,
+            'scenario_data': self.__scenario_data,
+            'tmp_data': self.__tmp_data,
+            'hash_data': self.__hash_data,
+            'first_content': self.__first_content,
+            'dag_deployment': self.__dag_deployment,
+            'total_time': self.__total_time,
+            'cloud_edge_transmit_time': self.__cloud_edge_transmit_time,
+        }
+
+    @classmethod
+    def from_dict(cls, record_dict: dict) -> 'ScenarioRecord':
+        return cls(**record_dict)
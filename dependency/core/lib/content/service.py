@@ -1,3 +1,4 @@
+import copy
 import json
 
 
@@ -21,6 +22,8 @@ class Service:
 
         # result data of service
         self.__content = content
+        # content is shared with forked services and copied before it is handed out (copy-on-write)
+        self.__content_shared = False
 
         self.__tmp_data = tmp if tmp else {}
 
@@ -74,10 +77,25 @@ class Service:
         return self.__transmit_time + self.__execute_time
 
     def get_content_data(self):
+        if self.__content_shared:
+            self.__content = copy.deepcopy(self.__content)
+            self.__content_shared = False
         return self.__content
 
     def set_content_data(self, content):
         self.__content = content
+        self.__content_shared = False
+
+    def fork(self) -> 'Service':
+        """
+        copy of the service for a forked task, the (possibly large) content is shared
+        and only deep-copied by the side that accesses it first.
+        """
+        new_service = copy.copy(self)
+        new_service.__tmp_data = copy.deepcopy(self.__tmp_data)
+        if self.__content is not None:
+            self.__content_shared = new_service.__content_shared = True
+        return new_service
 
     def get_tmp_data(self):
         return self.__tmp_data
@@ -94,7 +112,8 @@ class Service:
             'execute_data': {'transmit_time': self.get_transmit_time(),
                              'execute_time': self.get_execute_time(),
                              'real_execute_time': self.get_real_execute_time()},
-            'content': self.get_content_data(),
+            # read-only use (serialization), shared content is not copied
+            'content': self.__content,
             'tmp_data': self.get_tmp_data()
         }
 
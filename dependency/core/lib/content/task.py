@@ -1,10 +1,10 @@
 from typing import Tuple
 import copy
-import json
 import uuid
 
 from .service import Service
 from .dag import DAG
+from .codec import TaskCodec
 
 from core.lib.solver import LCASolver, IntermediateNodeSolver, PathSolver
 from core.lib.common import NameMaintainer
@@ -361,7 +361,7 @@ class Task:
 
         # get the longest transmitting time as cloud-edge transmitting time
         transmit_time = 0
-        for service_name in self.__dag_flow:
+        for service_name in self.__dag_flow.nodes:
             service = self.__dag_flow.get_node(service_name).service
             transmit_time = max(transmit_time, service.get_transmit_time())
         return transmit_time
@@ -429,7 +429,19 @@ class Task:
         return dag
 
     def fork_task(self, new_flow_index: str = None) -> 'Task':
-        new_task = copy.deepcopy(self)
+        """
+        fork task for next stage, the fork shares nothing mutable with the current task
+        except service contents, which are copied on access (see `Service.fork`).
+        """
+        new_task = copy.copy(self)
+        new_task.__all_edge_devices = copy.deepcopy(self.__all_edge_devices)
+        new_task.__priority_coefficients = copy.deepcopy(self.__priority_coefficients)
+        new_task.__metadata = copy.deepcopy(self.__metadata)
+        new_task.__raw_metadata = copy.deepcopy(self.__raw_metadata)
+        new_task.__dag_flow = self.__dag_flow.fork() if self.__dag_flow else None
+        new_task.__scenario_data = copy.deepcopy(self.__scenario_data)
+        new_task.__tmp_data = copy.deepcopy(self.__tmp_data)
+        new_task.hash_data = copy.deepcopy(self.hash_data)
         if new_flow_index and new_flow_index != self.__cur_flow_index:
             new_task.set_past_flow_index(self.__cur_flow_index)
             new_task.set_flow_index(new_flow_index)
@@ -525,8 +537,9 @@ class Task:
 
         return task
 
-    def serialize(self):
-        return json.dumps(self.to_dict())
+    def serialize(self, codec: str = None):
+        """serialize task with the given codec (json by default), see `TaskCodec`"""
+        return TaskCodec.get_codec(codec).encode(self.to_dict())
 
     @property
     def priority(self):
@@ -549,5 +562,5 @@ class Task:
 
     @classmethod
     def deserialize(cls, data: str):
-        data = json.loads(data)
+        data = TaskCodec.decode_any(data)
         return cls.from_dict(data)
@@ -1,4 +1,7 @@
+import atexit
 import os
+import threading
+from collections import deque
 from datetime import datetime
 from contextlib import contextmanager
 
@@ -12,13 +15,51 @@ from core.lib.common import FileOps, Context
 
 
 class OverheadEstimator:
-    def __init__(self, method_name, save_dir, agent_id=0):
+    """
+    Runtime overhead of a method, logged as CSV records (agent_id,timestamp,start_time,end_time,duration_seconds).
+
+    Records are buffered in memory and appended to the log in batches, according to the durability level:
+      - 'buffered' (default): appended at most `flush_interval` seconds after being recorded, without fsync
+      - 'flush': appended (to the OS page cache) on every record, without fsync
+      - 'fsync': appended and fsynced on every record
+    Both can be configured with `OVERHEAD_FLUSH_INTERVAL` / `OVERHEAD_DURABILITY` parameters.
+
+    Statistics (count / mean / percentiles over the latest `window` records) are maintained incrementally from
+    the log, which is shared by all writers (eg: several processes) of the method, so that each query only parses
+    records appended since the previous query.
+    """
+
+    DURABILITY_LEVELS = ('buffered', 'flush', 'fsync')
+    HEADER_COLUMNS = 'agent_id,timestamp,start_time,end_time,duration_seconds'
+
+    def __init__(self, method_name, save_dir, agent_id=0, flush_interval=None, durability=None, window=1000):
 
         self.method_name = method_name
         self.timer = Timer(f'Runtime Overhead of {method_name}')
         self.overhead_file = Context.get_file_path(os.path.join(save_dir, f'{method_name}_Overhead.txt'))
         self.latest_overhead = 0
         self.agent_id = agent_id
+
+        self.flush_interval = float(flush_interval if flush_interval is not None else
+                                    Context.get_parameter('OVERHEAD_FLUSH_INTERVAL', 1.0))
+        self.durability = durability or Context.get_parameter('OVERHEAD_DURABILITY', 'buffered')
+        assert self.durability in self.DURABILITY_LEVELS, \
+            f'Durability "{self.durability}" not supported, supported levels: {self.DURABILITY_LEVELS}'
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._flush_timer = None
+        # do not lose buffered records on interpreter exit
+        atexit.register(self.flush)
+
+        # running statistics over the log, read up to `_read_offset` of the file with inode `_read_inode`
+        self._stats_lock = threading.Lock()
+        self._count = 0
+        self._sum = 0.0
+        self._window = deque(maxlen=window)
+        self._read_offset = 0
+        self._read_inode = None
+
         # ensure directory and header exist; do NOT truncate existing logs implicitly
         self._ensure_file_initialized()
 
@@ -63,44 +104,76 @@ class OverheadEstimator:
 
     def get_average_overhead(self):
         """
-        Compute the average overhead from the log file.
+        Average overhead of all records in the log (of every writer).
         Compatible with both the new CSV format and legacy plain-number format.
         Returns 0.0 when no valid records exist.
         """
+        with self._stats_lock:
+            self._update_stats()
+            return self._sum / self._count if self._count else 0.0
+
+    def get_overhead_stats(self, percentiles=(50, 90, 99)):
+        """count and mean of all records, and percentiles of the latest `window` records"""
+        with self._stats_lock:
+            self._update_stats()
+            stats = {'count': self._count, 'mean': self._sum / self._count if self._count else 0.0}
+            window = sorted(self._window)
+        for percentile in percentiles:
+            stats[f'p{percentile}'] = window[min(int(len(window) * percentile / 100), len(window) - 1)] \
+                if window else 0.0
+        return stats
+
+    def _update_stats(self):
+        # records of this process are visible to queries as soon as they are recorded
+        self.flush()
         if not os.path.exists(self.overhead_file):
-            return 0.0
-        durations = []
-        with open(self.overhead_file, 'r') as f:
+            return
+        with open(self.overhead_file, 'rb') as f:
             with self._lock_file_shared(f):
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    # skip comments and header line
-                    if line.startswith('#') or line.lower().startswith('agent_id'):
-                        continue
-                    parts = [p.strip() for p in line.split(',')]
-                    # CSV format: agent_id,timestamp,start_time,end_time,duration_seconds
-                    if len(parts) >= 5:
-                        try:
-                            durations.append(float(parts[-1]))
-                        except ValueError:
-                            continue
-                    else:
-                        # legacy format: a single float per line
-                        try:
-                            durations.append(float(line))
-                        except ValueError:
-                            continue
-        return sum(durations) / len(durations) if durations else 0.0
+                stat = os.fstat(f.fileno())
+                if stat.st_ino != self._read_inode or stat.st_size < self._read_offset:
+                    # log was cleared or replaced, restart from its beginning
+                    self._reset_stats()
+                    self._read_inode = stat.st_ino
+                f.seek(self._read_offset)
+                data = f.read()
+        # only consume complete lines
+        end = data.rfind(b'\n') + 1
+        self._read_offset += end
+        for line in data[:end].decode('utf-8', errors='ignore').splitlines():
+            duration = self._parse_duration(line)
+            if duration is not None:
+                self._count += 1
+                self._sum += duration
+                self._window.append(duration)
+
+    def _reset_stats(self):
+        self._count = 0
+        self._sum = 0.0
+        self._window.clear()
+        self._read_offset = 0
+        self._read_inode = None
+
+    def _parse_duration(self, line):
+        line = line.strip()
+        if not line:
+            return None
+        # skip comments and header line
+        if line.startswith('#') or line.lower().startswith('agent_id'):
+            return None
+        parts = [p.strip() for p in line.split(',')]
+        try:
+            # CSV format: agent_id,timestamp,start_time,end_time,duration_seconds
+            # legacy format: a single float per line
+            return float(parts[-1]) if len(parts) >= 5 else float(line)
+        except ValueError:
+            return None
 
     def write_overhead(self, overhead):
         """
-        Append a record with human-readable timestamps and duration in seconds.
-        Safe for concurrent writers on POSIX platforms.
+        Record an overhead with human-readable timestamps and duration in seconds.
+        Records are appended to the log according to the durability level, safe for concurrent writers on POSIX.
         """
-        # ensure directory and header exist
-        self._ensure_file_initialized()
         # prefer timer times if available
         start_ts = getattr(self.timer, 'start_time', None)
         end_ts = getattr(self.timer, 'end_time', None)
@@ -110,12 +183,35 @@ class OverheadEstimator:
         start_str = self._format_dt(datetime.fromtimestamp(start_ts)) if start_ts else ''
         end_str = self._format_dt(datetime.fromtimestamp(end_ts)) if end_ts else ''
         line = f"{self.agent_id},{ts_str},{start_str},{end_str},{float(overhead):.6f}\n"
-        # open and lock for append
-        with open(self.overhead_file, 'a') as f:
-            with self._lock_file(f):
-                f.write(line)
-                f.flush()
-                os.fsync(f.fileno())
+
+        with self._lock:
+            self._buffer.append(line)
+            if self.durability == 'buffered' and self.flush_interval > 0:
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        """append buffered records to the log"""
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not lines:
+                return
+            # ensure directory and header exist
+            self._ensure_file_initialized()
+            # open and lock for append, a single write keeps the batch contiguous
+            with open(self.overhead_file, 'a') as f:
+                with self._lock_file(f):
+                    f.write(''.join(lines))
+                    f.flush()
+                    if self.durability == 'fsync':
+                        os.fsync(f.fileno())
 
     def clear(self):
         """
@@ -123,6 +219,10 @@ class OverheadEstimator:
         Use this explicitly if you want to start a fresh log. Thread/process-safe.
         """
         self.latest_overhead = 0
+        with self._lock:
+            self._buffer = []
+        with self._stats_lock:
+            self._reset_stats()
         # ensure directory exists
         dir_path = os.path.dirname(self.overhead_file)
         if dir_path:
@@ -131,12 +231,7 @@ class OverheadEstimator:
         # open with write mode to truncate
         with open(self.overhead_file, 'w') as f:
             with self._lock_file(f):
-                created = self._format_dt(datetime.now())
-                f.write(f"# Overhead Log for {self.method_name}\n")
-                f.write(f"# Created: {created}\n")
-                f.write("# Columns: agent_id,timestamp,start_time,end_time,duration_seconds\n")
-                # CSV header line for easy parsing
-                f.write("agent_id,timestamp,start_time,end_time,duration_seconds\n")
+                self._write_header(f)
                 f.flush()
                 os.fsync(f.fileno())
 
@@ -149,11 +244,7 @@ class OverheadEstimator:
             # create and write header
             with open(self.overhead_file, 'w') as f:
                 with self._lock_file(f):
-                    created = self._format_dt(datetime.now())
-                    f.write(f"# Overhead Log for {self.method_name}\n")
-                    f.write(f"# Created: {created}\n")
-                    f.write("# Columns: agent_id,timestamp,start_time,end_time,duration_seconds\n")
-                    f.write("agent_id,timestamp,start_time,end_time,duration_seconds\n")
+                    self._write_header(f)
                     f.flush()
                     os.fsync(f.fileno())
         else:
@@ -165,14 +256,18 @@ class OverheadEstimator:
                         f.seek(0, os.SEEK_END)
                         if f.tell() == 0:
                             f.seek(0)
-                            created = self._format_dt(datetime.now())
-                            f.write(f"# Overhead Log for {self.method_name}\n")
-                            f.write(f"# Created: {created}\n")
-                            f.write("# Columns: agent_id,timestamp,start_time,end_time,duration_seconds\n")
-                            f.write("agent_id,timestamp,start_time,end_time,duration_seconds\n")
+                            self._write_header(f)
                             f.flush()
                             os.fsync(f.fileno())
 
+    def _write_header(self, f):
+        created = self._format_dt(datetime.now())
+        f.write(f"# Overhead Log for {self.method_name}\n")
+        f.write(f"# Created: {created}\n")
+        f.write(f"# Columns: {self.HEADER_COLUMNS}\n")
+        # CSV header line for easy parsing
+        f.write(f"{self.HEADER_COLUMNS}\n")
+
     @staticmethod
     def _format_dt(dt: datetime) -> str:
         return dt.strftime('%Y-%m-%d %H:%M:%S.%f')
@@ -1,16 +1,222 @@
 import json
+import math
+import os
+import threading
 import time
-import bisect
+
+from core.lib.common import Context, LOGGER
+
+
+class QuantileSketch:
+    """
+    Streaming quantile sketch over a log-spaced histogram (DDSketch-like) with bounded memory.
+
+    A value at any rank is estimated within `relative_accuracy` (relative error) of the exact value at that rank,
+    as long as at most `max_bins` bins are kept per sign; beyond that the bins of the smallest magnitudes are merged,
+    which only affects the lowest quantiles.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048, min_value: float = 1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+
+        self.count = 0
+        self.zero_count = 0
+        self.positive = _BinStore(max_bins)
+        self.negative = _BinStore(max_bins)
+
+    def get_key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def get_value(self, key: int) -> float:
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value > self.min_value:
+            self.positive.add(self.get_key(value), count)
+        elif value < -self.min_value:
+            self.negative.add(self.get_key(-value), count)
+        else:
+            self.zero_count += count
+        self.count += count
+
+    def get_values_at_ranks(self, ranks: list) -> list:
+        """estimated values at the given ascending (0-based) ranks, in a single pass over the bins"""
+        values = []
+        ranks = iter(ranks)
+        rank = next(ranks, None)
+        cumulative = 0
+        value = None
+        for sign, key, count in self.iter_bins():
+            cumulative += count
+            while rank is not None and rank < cumulative:
+                value = sign * self.get_value(key) if sign else 0.0
+                values.append(value)
+                rank = next(ranks, None)
+            if rank is None:
+                return values
+        # ranks beyond the count fall on the largest value
+        values.append(value)
+        values.extend(value for _ in ranks)
+        return values
+
+    def iter_bins(self):
+        """(sign, key, count) of non-empty bins in ascending order of values"""
+        for key, count in self.negative.iter_bins(reverse=True):
+            yield -1, key, count
+        if self.zero_count:
+            yield 0, 0, self.zero_count
+        for key, count in self.positive.iter_bins():
+            yield 1, key, count
+
+    def to_dict(self) -> dict:
+        return {'relative_accuracy': self.relative_accuracy, 'zero_count': self.zero_count,
+                'positive': self.positive.to_list(), 'negative': self.negative.to_list()}
+
+    def merge_dict(self, data: dict) -> None:
+        """add the bins of a sketch persisted by `to_dict` (re-binned if the accuracy differs)"""
+        gamma = (1 + data['relative_accuracy']) / (1 - data['relative_accuracy'])
+        for sign, (offset, counts) in ((1, data['positive']), (-1, data['negative'])):
+            for index, count in enumerate(counts):
+                if count:
+                    self.add(sign * 2 * gamma ** (offset + index) / (gamma + 1), count)
+        if data['zero_count']:
+            self.add(0.0, data['zero_count'])
+
+
+class _BinStore:
+    """dense counts of consecutive sketch keys, starting at key `offset`"""
+
+    def __init__(self, max_bins: int):
+        self.max_bins = max_bins
+        self.offset = 0
+        self.counts = []
+
+    def add(self, key: int, count: int = 1) -> None:
+        if not self.counts:
+            self.offset = key
+            self.counts = [0]
+        elif key < self.offset:
+            # keys below a full store fall into its lowest (merged) bin
+            key = max(key, self.offset + len(self.counts) - self.max_bins)
+            self.counts[0:0] = [0] * (self.offset - key)
+            self.offset = key
+        elif key >= self.offset + len(self.counts):
+            if key - self.offset >= self.max_bins:
+                self.collapse(key - self.max_bins + 1)
+            self.counts.extend([0] * (key - self.offset - len(self.counts) + 1))
+        self.counts[key - self.offset] += count
+
+    def collapse(self, offset: int) -> None:
+        """merge the bins below `offset` into the bin at `offset`"""
+        merged = sum(self.counts[:offset - self.offset + 1])
+        del self.counts[:offset - self.offset]
+        if self.counts:
+            self.counts[0] = merged
+        else:
+            self.counts = [merged]
+        self.offset = offset
+
+    def iter_bins(self, reverse: bool = False):
+        keys = range(len(self.counts) - 1, -1, -1) if reverse else range(len(self.counts))
+        for index in keys:
+            if self.counts[index]:
+                yield self.offset + index, self.counts[index]
+
+    def to_list(self) -> list:
+        return [self.offset, list(self.counts)]
+
+
+class UrgencyHistory:
+    """process-wide history of relative remaining times of a service, persisted periodically by `PriorityEstimator`"""
+
+    def __init__(self, service_name: str, relative_accuracy: float, max_bins: int):
+        self.service_name = service_name
+        self.file_path = f'{service_name}.json'
+        self.lock = threading.Lock()
+        self.sketch = QuantileSketch(relative_accuracy=relative_accuracy, max_bins=max_bins)
+        self.dirty = False
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.file_path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (ValueError, OSError) as e:
+            LOGGER.warning(f'[Priority Estimation] Load urgency history of service "{self.service_name}" '
+                           f'failed: {str(e)}')
+            return
+        if isinstance(data, list):
+            # legacy history holding every sample
+            for value in data:
+                self.sketch.add(value)
+        else:
+            self.sketch.merge_dict(data)
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            data = self.sketch.to_dict()
+            self.dirty = False
+        tmp_path = f'{self.file_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.file_path)
+
+    def update(self, value: float, threshold_num: int):
+        """
+        add a sample and return the last values of `threshold_num` nearly equal chunks of the sorted history before it
+        (None while the history is shorter than `threshold_num`)
+        """
+        with self.lock:
+            count = self.sketch.count
+            thresholds = None
+            if count >= threshold_num:
+                thresholds = self.sketch.get_values_at_ranks(self.get_threshold_ranks(count, threshold_num))
+            self.sketch.add(value)
+            self.dirty = True
+        return thresholds
+
+    @staticmethod
+    def get_threshold_ranks(count: int, n: int) -> list:
+        """ranks of the last samples of `n` nearly equal chunks of `count` sorted samples"""
+        chunk_size, remainder = divmod(count, n)
+        ranks = []
+        end = 0
+        for i in range(n):
+            end += chunk_size + (1 if i < remainder else 0)
+            ranks.append(max(end - 1, 0))
+        return ranks
 
 
 class PriorityEstimator:
+    """
+    Priority of tasks from the importance of their source and their urgency.
+
+    Urgency levels come from the quantiles of the relative remaining times seen by each service,
+    which are kept in process-wide bounded `QuantileSketch` histories (shared by all estimators) and
+    persisted to `{service_name}.json` in background every `PRIORITY_HISTORY_SAVE_INTERVAL` seconds.
+    Thresholds are estimated within `PRIORITY_HISTORY_ACCURACY` relative error of the exact quantiles.
+    """
+
+    _lock = threading.Lock()
+    _histories = {}
+    _saver = None
+
+    HISTORY_ACCURACY = float(Context.get_parameter('PRIORITY_HISTORY_ACCURACY', 0.01))
+    HISTORY_MAX_BINS = int(Context.get_parameter('PRIORITY_HISTORY_MAX_BINS', 2048))
+    HISTORY_SAVE_INTERVAL = float(Context.get_parameter('PRIORITY_HISTORY_SAVE_INTERVAL', 10))
+
     def __init__(self, importance_weight, urgency_weight, priority_levels, deadline):
         self.priority_level_num = priority_levels
         self.importance_weight = importance_weight
         self.urgency_weight = urgency_weight
         self.deadline = deadline
-        # Track which services have sorted histories to skip repeated checks
-        self._sorted_services = set()
 
     def calculate_priority(self, task):
         importance = task.get_source_importance()  # Value range: 0~(priority_level_num-1)
@@ -34,13 +240,12 @@ class PriorityEstimator:
         service_name = task.get_current_service_info()[0]
 
         remaining_time = self.get_relative_remaining_time(task.get_total_start_time())
-        urgency_threshold_list = self.get_urgency_threshold(service_name)
-        self.update_urgency_history(service_name, remaining_time)
+        urgency_threshold_list = self.update_urgency_history(service_name, remaining_time)
 
         if urgency_threshold_list is None:
             return 0
         else:
-            # thresholds are expected to be sorted ascending
+            # thresholds are sorted ascending
             urgency = 0
             for value in urgency_threshold_list:
                 if remaining_time >= value:
@@ -49,58 +254,39 @@ class PriorityEstimator:
                     break
         return urgency
 
-    def get_urgency_threshold(self, service_name):
-        urgency_list = self.get_urgency_history(service_name)
-        if len(urgency_list) < self.priority_level_num - 1:
-            return None
-        else:
-            # Ensure the history is sorted before using it (also persist this fix once)
-            if any(urgency_list[i] > urgency_list[i + 1] for i in range(len(urgency_list) - 1)):
-                urgency_list.sort()
-                with open(f'{service_name}.json', 'w') as f:
-                    json.dump(urgency_list, f)
-                self._sorted_services.add(service_name)
-
-            # urgency_list is maintained in non-decreasing order by update_urgency_history
-            urgency_threshold = self.split_list_into_chunks_last(urgency_list, self.priority_level_num - 1)
-            # Ensure thresholds are non-decreasing to keep comparison logic stable
-            for i in range(1, len(urgency_threshold)):
-                if urgency_threshold[i] < urgency_threshold[i - 1]:
-                    urgency_threshold[i] = urgency_threshold[i - 1]
-            return urgency_threshold
-
-    def get_urgency_history(self, service_name):
-        try:
-            with open(f'{service_name}.json') as f:
-                urgency_history = json.load(f)
-            return urgency_history
-        except FileNotFoundError:
-            return []
-
     def update_urgency_history(self, service_name, urgency):
-        urgency_history = self.get_urgency_history(service_name)
+        """record the remaining time in the history of the service and return the urgency thresholds before it"""
+        threshold_num = max(self.priority_level_num - 1, 1)
+        thresholds = self.get_urgency_history(service_name).update(urgency, threshold_num)
+        return thresholds if self.priority_level_num > 1 else None
+
+    @classmethod
+    def get_urgency_history(cls, service_name) -> UrgencyHistory:
+        with cls._lock:
+            if service_name not in cls._histories:
+                cls._histories[service_name] = UrgencyHistory(service_name, cls.HISTORY_ACCURACY,
+                                                              cls.HISTORY_MAX_BINS)
+            if cls._saver is None or not cls._saver.is_alive():
+                cls._saver = threading.Thread(target=cls.loop_save_histories, daemon=True)
+                cls._saver.start()
+            return cls._histories[service_name]
 
-        # One-time normalization per service: if not known sorted, verify and fix
-        if service_name not in self._sorted_services:
-            if any(urgency_history[i] > urgency_history[i + 1] for i in range(len(urgency_history) - 1)):
-                urgency_history.sort()
-            self._sorted_services.add(service_name)
+    @classmethod
+    def loop_save_histories(cls):
+        while True:
+            time.sleep(cls.HISTORY_SAVE_INTERVAL)
+            cls.save_histories()
 
-        # Insert the new value while keeping non-decreasing order
-        bisect.insort(urgency_history, urgency)
-        with open(f'{service_name}.json', 'w') as f:
-            json.dump(urgency_history, f)
+    @classmethod
+    def save_histories(cls):
+        with cls._lock:
+            histories = list(cls._histories.values())
+        for history in histories:
+            try:
+                history.save()
+            except Exception as e:
+                LOGGER.warning(f'[Priority Estimation] Save urgency history of service "{history.service_name}" '
+                               f'failed: {str(e)}')
 
     def get_relative_remaining_time(self, start_time):
         return (time.time() - start_time) / self.deadline
-
-    def split_list_into_chunks_last(self, list_input, n):
-        chunk_size, remainder = divmod(len(list_input), n)
-        chunks_last = []
-        start = 0
-        for i in range(n):
-            end = start + chunk_size + (1 if i < remainder else 0)
-            chunks_last.append(list_input[end - 1])
-            start = end
-
-        return chunks_last
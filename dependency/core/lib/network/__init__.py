@@ -2,5 +2,6 @@ from .utils import *
 from .node import NodeInfo
 from .port import PortInfo
 from .api import NetworkAPIPath, NetworkAPIMethod
-from .client import http_request
+from .client import http_request, HttpSessionPool
 
+from .middleware import TaskCodecMiddleware
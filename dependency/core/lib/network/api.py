@@ -5,6 +5,7 @@ class NetworkAPIPath:
     PROCESSOR_PROCESS = '/predict'
     PROCESSOR_PROCESS_RETURN = '/predict_and_return'
     PROCESSOR_QUEUE_LENGTH = '/queue_length'
+    PROCESSOR_LOOP_STATE = '/loop_state'
 
     DISTRIBUTOR_DISTRIBUTE = '/distribute'
     DISTRIBUTOR_RESULT = '/result'
@@ -17,8 +18,10 @@ class NetworkAPIPath:
     SCHEDULER_SCHEDULE = '/schedule'
     SCHEDULER_OVERHEAD = '/overhead'
     SCHEDULER_SCENARIO = '/scenario'
+    SCHEDULER_SCENARIO_BATCH = '/scenarios'
     SCHEDULER_POST_RESOURCE = '/resource'
     SCHEDULER_GET_RESOURCE = '/resource'
+    SCHEDULER_RESOURCE_LAG = '/resource_lag'
     SCHEDULER_SELECT_SOURCE_NODES = '/source_node_selection'
     SCHEDULER_INITIAL_DEPLOYMENT = '/initial_deployment'
 
@@ -63,6 +66,7 @@ class NetworkAPIMethod:
     PROCESSOR_PROCESS = 'POST'
     PROCESSOR_PROCESS_RETURN = 'POST'
     PROCESSOR_QUEUE_LENGTH = 'GET'
+    PROCESSOR_LOOP_STATE = 'GET'
 
     DISTRIBUTOR_DISTRIBUTE = 'POST'
     DISTRIBUTOR_RESULT = 'GET'
@@ -75,8 +79,10 @@ class NetworkAPIMethod:
     SCHEDULER_SCHEDULE = 'GET'
     SCHEDULER_OVERHEAD = 'GET'
     SCHEDULER_SCENARIO = 'POST'
+    SCHEDULER_SCENARIO_BATCH = 'POST'
     SCHEDULER_POST_RESOURCE = 'POST'
     SCHEDULER_GET_RESOURCE = 'GET'
+    SCHEDULER_RESOURCE_LAG = 'GET'
     SCHEDULER_SELECT_SOURCE_NODES = 'GET'
     SCHEDULER_INITIAL_DEPLOYMENT = 'GET'
 
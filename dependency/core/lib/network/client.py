@@ -1,5 +1,125 @@
-from core.lib.common import LOGGER
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.lib.common import LOGGER, Context, HttpRequestError
+
+
+class HttpSessionPool:
+    """
+    Per-process pool of keep-alive sessions keyed by host:port, shared by all threads.
+
+    Configured through environment parameters:
+      - HTTP_POOL_SIZE: max kept-alive connections per host:port (default 10)
+      - HTTP_MAX_RETRIES / HTTP_RETRY_BACKOFF: retries of failed connection attempts and their backoff factor,
+        requests that reached the server are never retried so that non-idempotent posts are not duplicated
+      - HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT: default timeouts in seconds
+      - HTTP_ENDPOINT_TIMEOUTS: per-endpoint timeouts, eg: "{'/predict_and_return': 600}"
+      - TASK_CODEC: preferred task codec, used towards peers advertising it in the `X-Task-Codecs` header
+    """
+
+    TASK_CODEC_HEADER = 'X-Task-Codecs'
+
+    _lock = threading.Lock()
+    _pid = None
+    _sessions = {}
+    _peer_task_codecs = {}
+
+    pool_size = int(Context.get_parameter('HTTP_POOL_SIZE', 10))
+    max_retries = int(Context.get_parameter('HTTP_MAX_RETRIES', 3))
+    retry_backoff = float(Context.get_parameter('HTTP_RETRY_BACKOFF', 0.2))
+    connect_timeout = float(Context.get_parameter('HTTP_CONNECT_TIMEOUT', 5))
+    read_timeout = float(Context.get_parameter('HTTP_READ_TIMEOUT', 120))
+    endpoint_timeouts = Context.get_parameter('HTTP_ENDPOINT_TIMEOUTS', default='{}', direct=False)
+    task_codec = Context.get_parameter('TASK_CODEC', 'json')
+
+    def __new__(cls, *args, **kwargs):
+        raise RuntimeError("HttpSessionPool is a utility class and cannot be instantiated.")
+
+    @classmethod
+    def get_session(cls, url: str) -> requests.Session:
+        key = cls.get_pool_key(url)
+        with cls._lock:
+            # sessions (and their sockets) must not be shared with forked worker processes
+            if cls._pid != os.getpid():
+                cls._sessions = {}
+                cls._pid = os.getpid()
+            if key not in cls._sessions:
+                cls._sessions[key] = cls._create_session(key)
+            return cls._sessions[key]
+
+    @classmethod
+    def _create_session(cls, key: str) -> requests.Session:
+        session = requests.Session()
+        session.hooks['response'].append(lambda response, *args, **kwargs: cls._record_peer(key, response))
+        # keep every request as stateless as a standalone `requests.request` call
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        retry = Retry(total=cls.max_retries, connect=cls.max_retries, read=0, status=0, other=0,
+                      allowed_methods=None, backoff_factor=cls.retry_backoff, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cls.pool_size, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @classmethod
+    def _record_peer(cls, key: str, response: requests.Response) -> None:
+        codecs = response.headers.get(cls.TASK_CODEC_HEADER)
+        cls._peer_task_codecs[key] = set(codecs.split(',')) if codecs else set()
+
+    @classmethod
+    def negotiate_task_codec(cls, url: str) -> str:
+        """
+        choose the task codec for requests to `url`: the preferred codec if the peer is known to support it
+        (from the `X-Task-Codecs` header of its previous responses), otherwise json which every component decodes.
+        """
+        if cls.task_codec in cls._peer_task_codecs.get(cls.get_pool_key(url), ()):
+            return cls.task_codec
+        return 'json'
+
+    @staticmethod
+    def get_pool_key(url: str) -> str:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        return f'{parts.hostname}:{port}'
+
+    @classmethod
+    def get_timeout(cls, url: str, timeout=None):
+        if timeout:
+            return timeout
+        path = urlsplit(url).path or '/'
+        if path in cls.endpoint_timeouts:
+            return cls.endpoint_timeouts[path]
+        return cls.connect_timeout, cls.read_timeout
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        """number of requests served and connections opened for each host:port"""
+        stats = {}
+        with cls._lock:
+            sessions = dict(cls._sessions) if cls._pid == os.getpid() else {}
+        for key, session in sessions.items():
+            num_requests, num_connections = 0, 0
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for pool_key in pools.keys():
+                    pool = pools.get(pool_key)
+                    if pool is not None:
+                        num_requests += pool.num_requests
+                        num_connections += pool.num_connections
+            stats[key] = {'requests': num_requests, 'connections': num_connections}
+        return stats
+
+    @classmethod
+    def close_all(cls) -> None:
+        with cls._lock:
+            sessions, cls._sessions = cls._sessions, {}
+        for session in sessions.values():
+            session.close()
 
 
 def http_request(url,
@@ -7,27 +127,43 @@ def http_request(url,
                  timeout=None,
                  binary=True,
                  no_decode=False,
+                 raise_error=False,
                  **kwargs):
-    _max_timeout = timeout if timeout else 1000
+    """
+    send http request through the pooled keep-alive session of the target host.
+    failures are logged with their category (see `HttpRequestError`) and None is returned,
+    or the `HttpRequestError` is raised if `raise_error` is set.
+    """
     _method = 'GET' if not method else method
 
     try:
-        response = requests.request(method=_method, url=url, timeout=_max_timeout, **kwargs)
+        try:
+            response = HttpSessionPool.get_session(url).request(method=_method, url=url,
+                                                                timeout=HttpSessionPool.get_timeout(url, timeout),
+                                                                **kwargs)
+        except requests.exceptions.Timeout as err:
+            raise HttpRequestError(HttpRequestError.TIMEOUT, url, err)
+        except (ConnectionRefusedError, requests.exceptions.ConnectionError) as err:
+            raise HttpRequestError(HttpRequestError.CONNECTION, url, err)
+        except requests.exceptions.RequestException as err:
+            raise HttpRequestError(HttpRequestError.REQUEST, url, err)
+
         if response.status_code == 200:
             if no_decode:
                 return response
-            else:
+            try:
                 return response.json() if binary else response.content.decode('utf-8')
+            except ValueError as err:
+                raise HttpRequestError(HttpRequestError.DECODE, url, err)
         elif 200 < response.status_code < 400:
             LOGGER.info(f'Redirect URL: {response.url}')
-        LOGGER.warning(f'Get invalid status code {response.status_code} in request {url}')
-    except (ConnectionRefusedError, requests.exceptions.ConnectionError):
-        LOGGER.warning(f'Connection refused in request {url}')
-    except requests.exceptions.HTTPError as err:
-        LOGGER.warning(f'Http Error in request {url}: {err}')
-    except requests.exceptions.Timeout as err:
-        LOGGER.warning(f'Timeout error in request {url}: {err}')
-    except requests.exceptions.RequestException as err:
-        LOGGER.warning(f'Error occurred in request {url}: {err}')
+        raise HttpRequestError(HttpRequestError.STATUS, url, f'invalid status code {response.status_code}',
+                               status_code=response.status_code)
+    except HttpRequestError as err:
+        if raise_error:
+            raise
+        LOGGER.warning(f'{err}')
     except Exception as err:
+        if raise_error:
+            raise HttpRequestError(HttpRequestError.UNKNOWN, url, err) from err
         LOGGER.warning(f'Error occurred in request {url}: {err}')
@@ -0,0 +1,18 @@
+class TaskCodecMiddleware:
+    """ASGI middleware advertising the task codecs a component can decode (see `HttpSessionPool.negotiate_task_codec`)"""
+
+    def __init__(self, app, codecs: list):
+        self.app = app
+        self.header = (b'x-task-codecs', ','.join(codecs).encode('latin-1'))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_header(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [self.header]
+            await send(message)
+
+        await self.app(scope, receive, send_with_header)
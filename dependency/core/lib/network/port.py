@@ -1,8 +1,85 @@
+import threading
+import time
+
 import kubernetes as k8s
-from core.lib.common import Context, SystemConstant
+from core.lib.common import Context, SystemConstant, LOGGER
 
 
 class PortInfo:
+    """
+    Node ports of services in the namespace.
+
+    Service listings from the kubernetes api are cached for `PORT_CACHE_TTL` seconds. An expired (or invalidated)
+    cache is still served while a background refresh fetches the new listing (stale-while-revalidate),
+    so only the very first lookup in a process waits for the api server.
+    """
+
+    _api = None
+    _lock = threading.Lock()
+    _services = None
+    _update_time = 0.0
+    _refreshing = False
+
+    CACHE_TTL = float(Context.get_parameter('PORT_CACHE_TTL', 30))
+
+    @classmethod
+    def _get_api(cls) -> k8s.client.CoreV1Api:
+        if not cls._api:
+            k8s.config.load_incluster_config()
+            cls._api = k8s.client.CoreV1Api()
+        return cls._api
+
+    @classmethod
+    def _list_services(cls) -> dict:
+        """{service name: (service type, node port)}, node port is None for services without ports"""
+        namespace = Context.get_parameter('NAMESPACE')
+        svcs = cls._get_api().list_namespaced_service(namespace)
+        return {svc.metadata.name: (svc.spec.type, svc.spec.ports[0].node_port if svc.spec.ports else None)
+                for svc in svcs.items}
+
+    @classmethod
+    def _refresh(cls) -> None:
+        try:
+            services = cls._list_services()
+            with cls._lock:
+                cls._services = services
+                cls._update_time = time.time()
+        except Exception as e:
+            LOGGER.warning(f'[Port Cache] Refresh service ports failed: {str(e)}')
+        finally:
+            with cls._lock:
+                cls._refreshing = False
+
+    @classmethod
+    def _get_services(cls) -> dict:
+        with cls._lock:
+            services = cls._services
+            expired = time.time() - cls._update_time > cls.CACHE_TTL
+            revalidate = services is not None and expired and not cls._refreshing
+            if revalidate:
+                cls._refreshing = True
+
+        if services is None:
+            # nothing cached yet, fetch synchronously
+            services = cls._list_services()
+            with cls._lock:
+                cls._services = services
+                cls._update_time = time.time()
+        elif revalidate:
+            threading.Thread(target=cls._refresh, daemon=True).start()
+
+        return services
+
+    @classmethod
+    def invalidate_cache(cls, drop: bool = False) -> None:
+        """
+        mark cached service ports as expired so that the next lookup revalidates them in background,
+        or drop them entirely so that the next lookup re-fetches synchronously.
+        """
+        with cls._lock:
+            cls._update_time = 0.0
+            if drop:
+                cls._services = None
 
     @staticmethod
     def get_component_port(component_name: str) -> int:
@@ -15,21 +92,16 @@ class PortInfo:
     @staticmethod
     def get_all_ports(keyword: str) -> dict:
         ports_dict = {}
-        k8s.config.load_incluster_config()
-        v1 = k8s.client.CoreV1Api()
-        namespace = Context.get_parameter('NAMESPACE')
-        svcs = v1.list_namespaced_service(namespace)
-        for svc in svcs.items:
-            if keyword in svc.metadata.name:
-                if svc.spec.type != "NodePort":
-                    assert None, f"Service '{svc.metadata.name}' is not of type NodePort."
-                ports_dict[svc.metadata.name] = int(svc.spec.ports[0].node_port)
+        for svc_name, (svc_type, node_port) in PortInfo._get_services().items():
+            if keyword in svc_name:
+                if svc_type != "NodePort":
+                    assert None, f"Service '{svc_name}' is not of type NodePort."
+                ports_dict[svc_name] = int(node_port)
         return ports_dict
 
     @staticmethod
     def get_service_ports_dict() -> dict:
         component_name = SystemConstant.PROCESSOR.value
-        PortInfo.get_all_ports(component_name)
         ports_dict = PortInfo.get_all_ports(component_name)
         component_ports_dict = {}
         for svc_name in ports_dict:
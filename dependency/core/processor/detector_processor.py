@@ -12,14 +12,56 @@ from core.lib.common import ClassFactory, ClassType
 
 @ClassFactory.register(ClassType.PROCESSOR, alias='detector_processor')
 class DetectorProcessor(Processor):
-    def __init__(self):
+    def __init__(self, max_batch_tasks=1, max_batch_wait=0):
         super().__init__()
 
         self.detector = Context.get_instance('Detector')
 
         self.frame_size = None
 
+        self.max_batch_tasks = max(int(max_batch_tasks), 1)
+        self.max_batch_wait = float(max_batch_wait)
+
+        # {task number of batch: [frame number, inference time]}
+        self.throughput_stats = {}
+
     def __call__(self, task: Task):
+        image_list = self.read_images(task)
+        if image_list is None:
+            return None
+
+        result = self.infer(image_list)
+        task = self.get_scenario(result, task)
+        task.set_current_content(convert_ndarray_to_list(result))
+
+        return task
+
+    def process_batch(self, tasks: List[Task]) -> List[Task]:
+        """concatenate frames of several tasks into one detector call and split results back into each task"""
+        image_lists = [self.read_images(task) for task in tasks]
+        batch_images = [image for image_list in image_lists if image_list for image in image_list]
+        if not batch_images:
+            return [None] * len(tasks)
+
+        with Timer(f'Micro-batch / {len(tasks)} task') as timer:
+            batch_result = self.infer(batch_images)
+        self.record_throughput(len(tasks), len(batch_images), timer.get_elapsed_time())
+
+        new_tasks = []
+        offset = 0
+        for task, image_list in zip(tasks, image_lists):
+            if image_list is None:
+                new_tasks.append(None)
+                continue
+            result = batch_result[offset: offset + len(image_list)]
+            offset += len(image_list)
+            task = self.get_scenario(result, task)
+            task.set_current_content(convert_ndarray_to_list(result))
+            new_tasks.append(task)
+
+        return new_tasks
+
+    def read_images(self, task: Task):
         data_file_path = task.get_file_path()
         cap = cv2.VideoCapture(data_file_path)
         image_list = []
@@ -34,11 +76,25 @@ class DetectorProcessor(Processor):
             LOGGER.critical(f'Source: {task.get_source_id()}, Task: {task.get_task_id()}')
             LOGGER.critical(f'file_path: {task.get_file_path()}')
             return None
-        result = self.infer(image_list)
-        task = self.get_scenario(result, task)
-        task.set_current_content(convert_ndarray_to_list(result))
 
-        return task
+        return image_list
+
+    def record_throughput(self, task_num, frame_num, elapsed_time):
+        frames, duration = self.throughput_stats.get(task_num, (0, 0))
+        self.throughput_stats[task_num] = (frames + frame_num, duration + elapsed_time)
+
+        throughput = self.get_throughput(task_num)
+        single_throughput = self.get_throughput(1)
+        if throughput is None:
+            return
+        gain = f'{throughput / single_throughput:.2f}x' if single_throughput else 'unknown'
+        LOGGER.info(f'[Micro-batch] {task_num} tasks / {frame_num} frames, '
+                    f'throughput: {throughput:.2f} frames/s, gain over per-task path: {gain}')
+
+    def get_throughput(self, task_num):
+        """average inference throughput (frames/s) of batches with `task_num` tasks"""
+        frames, duration = self.throughput_stats.get(task_num, (0, 0))
+        return frames / duration if duration > 0 else None
 
     def infer(self, images: List[np.ndarray]):
         assert self.detector, 'No detector defined!'
@@ -16,19 +16,28 @@ class MMWaveDetectorProcessor(Processor):
 
     def __call__(self, task: Task):
         data_file_path = task.get_file_path()
-        # extract zip to a temporary directory
-        tmp_dir = f"mmwave_{task.get_source_id()}_{task.get_task_id()}_dir"
-        FileOps.create_directory(tmp_dir)
-        FileOps.unzip_file(data_file_path, tmp_dir)
-
-        # collect .bin files
-        file_list = []
-        for root, _, files in os.walk(tmp_dir):
-            for fn in files:
-                if fn.lower().endswith('.bin'):
-                    file_list.append(os.path.join(root, fn))
-        # sort by filename to preserve order
-        file_list.sort()
+
+        # frames of an uncompressed zip are read in place, otherwise the zip is extracted
+        members = FileOps.locate_stored_zip_members(data_file_path)
+        if members is not None:
+            tmp_dir = None
+            # sort by member name to preserve order
+            file_list = [(data_file_path, offset, size) for name, offset, size in sorted(members)
+                         if name.lower().endswith('.bin')]
+        else:
+            # extract zip to a temporary directory
+            tmp_dir = f"mmwave_{task.get_source_id()}_{task.get_task_id()}_dir"
+            FileOps.create_directory(tmp_dir)
+            FileOps.unzip_file(data_file_path, tmp_dir)
+
+            # collect .bin files
+            file_list = []
+            for root, _, files in os.walk(tmp_dir):
+                for fn in files:
+                    if fn.lower().endswith('.bin'):
+                        file_list.append(os.path.join(root, fn))
+            # sort by filename to preserve order
+            file_list.sort()
 
         result = self.infer(file_list)
 
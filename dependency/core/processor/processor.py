@@ -1,3 +1,5 @@
+from typing import List
+
 from core.lib.content import Task
 from core.lib.common import Context
 
@@ -12,9 +14,17 @@ class Processor:
                 Context.get_algorithm('PRO_SCENARIO', scenario_extractor_text)
             )
 
+        # max number of queued tasks processed together and max seconds to wait for them,
+        # processors supporting micro-batching override `process_batch`
+        self.max_batch_tasks = 1
+        self.max_batch_wait = 0
+
     def __call__(self, task: Task):
         raise NotImplementedError
 
+    def process_batch(self, tasks: List[Task]) -> List[Task]:
+        return [self(task) for task in tasks]
+
     def get_scenario(self, result, task):
         scenarios = {}
 
@@ -1,4 +1,6 @@
 import threading
+import time
+from typing import List
 
 from fastapi import FastAPI, BackgroundTasks, UploadFile, File, Form
 
@@ -8,7 +10,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from core.lib.common import Context, SystemConstant
 from core.lib.common import LOGGER, FileOps
 from core.lib.network import NodeInfo, PortInfo, http_request, merge_address, NetworkAPIMethod, NetworkAPIPath
-from core.lib.content import Task
+from core.lib.network import HttpSessionPool, TaskCodecMiddleware
+from core.lib.content import Task, TaskCodec
 from core.lib.estimation import TimeEstimator
 
 
@@ -30,12 +33,18 @@ class ProcessorServer:
                      response_class=JSONResponse,
                      methods=[NetworkAPIMethod.PROCESSOR_QUEUE_LENGTH]
                      ),
-        ], log_level='trace', timeout=6000)
+            APIRoute(NetworkAPIPath.PROCESSOR_LOOP_STATE,
+                     self.query_loop_state,
+                     response_class=JSONResponse,
+                     methods=[NetworkAPIMethod.PROCESSOR_LOOP_STATE]
+                     ),
+        ], log_level='trace', timeout=6000, on_shutdown=[self.stop_loop_process])
 
         self.app.add_middleware(
             CORSMiddleware, allow_origins=["*"], allow_credentials=True,
             allow_methods=["*"], allow_headers=["*"],
         )
+        self.app.add_middleware(TaskCodecMiddleware, codecs=TaskCodec.get_supported_codecs())
 
         self.processor = Context.get_algorithm('PROCESSOR')
 
@@ -48,17 +57,23 @@ class ProcessorServer:
                                                 port=self.controller_port,
                                                 path=NetworkAPIPath.CONTROLLER_RETURN)
 
-        threading.Thread(target=self.loop_process).start()
+        # max seconds the loop blocks on an empty queue before re-checking the stop signal
+        self.loop_wait_timeout = float(Context.get_parameter('LOOP_WAIT_TIMEOUT', 1))
+        self.loop_stop_event = threading.Event()
+        self.loop_state_lock = threading.Lock()
+        self.loop_state = {'idle_time': 0.0, 'busy_time': 0.0, 'cpu_time': 0.0, 'processed_tasks': 0}
+
+        self.loop_thread = threading.Thread(target=self.loop_process, daemon=True)
+        self.loop_thread.start()
 
     async def process_service(self, backtask: BackgroundTasks, file: UploadFile = File(...), data: str = Form(...)):
         file_data = await file.read()
         cur_task = Task.deserialize(data)
-        backtask.add_task(self.process_service_background, data, file_data)
+        backtask.add_task(self.process_service_background, cur_task, file_data)
         LOGGER.debug(f'[Monitor Task] (Process Request) '
                      f'Source: {cur_task.get_source_id()} / Task: {cur_task.get_task_id()} ')
 
-    def process_service_background(self, data, file_data):
-        cur_task = Task.deserialize(data)
+    def process_service_background(self, cur_task, file_data):
         FileOps.save_data_file(cur_task, file_data)
         self.task_queue.put(cur_task)
         LOGGER.debug(f'[Task Queue] Queue Size (receive request): {self.task_queue.size()}')
@@ -82,26 +97,87 @@ class ProcessorServer:
     async def query_queue_length(self):
         return self.task_queue.size()
 
+    async def query_loop_state(self):
+        return self.get_loop_state()
+
+    def get_loop_state(self):
+        with self.loop_state_lock:
+            state = self.loop_state.copy()
+        state['running'] = self.loop_thread.is_alive() and not self.loop_stop_event.is_set()
+        return state
+
+    def stop_loop_process(self, timeout=None):
+        self.loop_stop_event.set()
+        if self.loop_thread is not threading.current_thread():
+            self.loop_thread.join(timeout=timeout)
+
     def loop_process(self):
         LOGGER.info('Start processing loop..')
-        while True:
-            if self.task_queue.empty():
-                continue
-            task = self.task_queue.get()
+        while not self.loop_stop_event.is_set():
+            idle_start = time.perf_counter()
+            # block until a task arrives instead of spinning on an empty queue
+            task = self.task_queue.get(block=True, timeout=self.loop_wait_timeout)
+            self.update_loop_state(idle_time=time.perf_counter() - idle_start)
             if not task:
                 continue
+            tasks = [task] + self.collect_batch_tasks() if self.processor.max_batch_tasks > 1 else [task]
             LOGGER.debug(f'[Task Queue] Queue Size (loop): {self.task_queue.size()}')
 
+            busy_start = time.perf_counter()
             try:
-                new_task = self.process_task_service(task)
+                new_tasks = self.process_batch_task_service(tasks) \
+                    if self.processor.max_batch_tasks > 1 else [self.process_task_service(task)]
+                for old_task, new_task in zip(tasks, new_tasks):
+                    if new_task:
+                        self.send_result_back_to_controller(new_task)
+                    FileOps.remove_data_file(old_task)
             except Exception as e:
                 LOGGER.critical("[Processor Error] Processor encountered error when processing data.")
                 LOGGER.exception(e)
+            finally:
+                self.update_loop_state(busy_time=time.perf_counter() - busy_start, processed_tasks=len(tasks))
+
+        LOGGER.info('Processing loop stopped.')
+
+    def update_loop_state(self, idle_time=0.0, busy_time=0.0, processed_tasks=0):
+        with self.loop_state_lock:
+            self.loop_state['idle_time'] += idle_time
+            self.loop_state['busy_time'] += busy_time
+            self.loop_state['processed_tasks'] += processed_tasks
+            # cpu time consumed by the loop thread itself, should stay flat while the queue is empty
+            self.loop_state['cpu_time'] = time.thread_time()
+
+    def collect_batch_tasks(self):
+        """drain up to `max_batch_tasks - 1` more tasks, waiting at most `max_batch_wait` seconds in total"""
+        tasks = []
+        deadline = time.perf_counter() + self.processor.max_batch_wait
+        while len(tasks) < self.processor.max_batch_tasks - 1:
+            remaining = deadline - time.perf_counter()
+            task = self.task_queue.get(block=remaining > 0, timeout=max(remaining, 0))
+            if not task:
+                break
+            tasks.append(task)
+        return tasks
+
+    def process_batch_task_service(self, tasks: List[Task]):
+        for task in tasks:
+            LOGGER.debug(f'[Monitor Task] (Process start) '
+                         f'Source: {task.get_source_id()} / Task: {task.get_task_id()} ')
+            TimeEstimator.record_dag_ts(task, is_end=False, sub_tag='real_execute')
+
+        new_tasks = self.processor.process_batch(tasks)
+
+        for task, new_task in zip(tasks, new_tasks):
+            if not new_task:
                 continue
+            duration = TimeEstimator.record_dag_ts(new_task, is_end=True, sub_tag='real_execute')
+            new_task.save_real_execute_time(duration)
+            LOGGER.debug(f'[Monitor Task] (Process end) '
+                         f'Source: {task.get_source_id()} / Task: {task.get_task_id()} ')
+            LOGGER.info(f'[Process Task] Source: {task.get_source_id()} / Task: {task.get_task_id()} '
+                        f'Duration: {duration} (batch of {len(tasks)} tasks)')
 
-            if new_task:
-                self.send_result_back_to_controller(new_task)
-            FileOps.remove_data_file(task)
+        return new_tasks
 
     def process_task_service(self, task: Task):
         LOGGER.debug(f'[Monitor Task] (Process start) Source: {task.get_source_id()} / Task: {task.get_task_id()} ')
@@ -119,4 +195,4 @@ class ProcessorServer:
     def send_result_back_to_controller(self, task):
 
         http_request(url=self.controller_address, method=NetworkAPIMethod.CONTROLLER_RETURN,
-                     data={'data': task.serialize()})
+                     data={'data': task.serialize(HttpSessionPool.negotiate_task_codec(self.controller_address))})
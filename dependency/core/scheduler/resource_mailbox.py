@@ -0,0 +1,111 @@
+import threading
+import time
+
+from core.lib.common import LOGGER
+
+
+class ResourceMailbox:
+    """
+    Resource updates pending for a scheduler agent, delivered to it by a thread of the mailbox at the agent's own pace.
+
+    Only the latest resource of each device is kept: a resource posted while a previous one of the same device
+    is still pending replaces it (coalesced), so a slow agent catches up with the latest state
+    instead of replaying every update, and posting never waits for the agent.
+    Lag of a delivery is the time from posting the delivered resource to the return of `agent.update_resource`.
+    """
+
+    def __init__(self, agent, agent_id, ema_alpha: float = 0.2):
+        self.agent = agent
+        self.agent_id = agent_id
+        self.ema_alpha = ema_alpha
+
+        self.cond = threading.Condition()
+        # device -> (resource, time of posting the resource, time since which the device has been pending)
+        self.pending = {}
+        # time since which the batch being delivered has been pending (None if not delivering)
+        self.delivering_since = None
+
+        self.posted = 0
+        self.coalesced = 0
+        self.delivered = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self.avg_lag = 0.0
+        self.max_lag = 0.0
+
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def post(self, device, resource):
+        now = time.time()
+        with self.cond:
+            self.posted += 1
+            if device in self.pending:
+                self.coalesced += 1
+                pending_since = self.pending[device][2]
+            else:
+                pending_since = now
+            self.pending[device] = (resource, now, pending_since)
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                pending, self.pending = self.pending, {}
+                self.delivering_since = min(since for _, _, since in pending.values())
+
+            for device, (resource, post_time, _) in pending.items():
+                try:
+                    self.agent.update_resource(device, resource)
+                    failed = False
+                except Exception as e:
+                    LOGGER.warning(f'[Resource Mailbox] (agent {self.agent_id}) '
+                                   f'Update resource of device {device} failed: {str(e)}')
+                    LOGGER.exception(e)
+                    failed = True
+                self.record_delivery(time.time() - post_time, failed)
+
+            with self.cond:
+                self.delivering_since = None
+
+    def record_delivery(self, lag, failed):
+        with self.cond:
+            if failed:
+                self.failed += 1
+                return
+            self.avg_lag = lag if self.delivered == 0 else self.ema_alpha * lag + (1 - self.ema_alpha) * self.avg_lag
+            self.delivered += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+
+    def get_metrics(self):
+        """
+        delivery counters, lags (seconds) of delivered resources,
+        and the number and age (seconds) of resources waiting for the agent
+        """
+        now = time.time()
+        with self.cond:
+            waiting_since = [since for _, _, since in self.pending.values()]
+            if self.delivering_since is not None:
+                waiting_since.append(self.delivering_since)
+            return {
+                'posted': self.posted,
+                'coalesced': self.coalesced,
+                'delivered': self.delivered,
+                'failed': self.failed,
+                'pending': len(self.pending),
+                'pending_age': now - min(waiting_since) if waiting_since else 0.0,
+                'last_lag': self.last_lag,
+                'avg_lag': self.avg_lag,
+                'max_lag': self.max_lag,
+            }
+
+    def close(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
@@ -3,11 +3,15 @@ import threading
 from core.lib.common import Context, LOGGER
 from core.lib.network import NodeInfo
 
+from .resource_mailbox import ResourceMailbox
+
 
 class Scheduler:
     def __init__(self):
         self.schedule_table = {}
         self.resource_table = {}
+        # resource updates are delivered to each agent through its own mailbox
+        self.resource_mailboxes = {}
 
         self.cloud_device = NodeInfo.get_cloud_node()
 
@@ -27,6 +31,7 @@ class Scheduler:
     def add_scheduler_agent(self, source_id):
         agent = Context.get_algorithm('SCH_AGENT', system=self, agent_id=source_id)
         threading.Thread(target=agent.run).start()
+        self.resource_mailboxes[source_id] = ResourceMailbox(agent, source_id)
         self.schedule_table[source_id] = agent
 
     def extract_scenario(self, task):
@@ -64,6 +69,11 @@ class Scheduler:
         agent.update_task(task)
         LOGGER.info(f'[Update Scenario] Source {source_id}: {scenario}')
 
+    def update_scheduler_scenarios(self, records):
+        """update scenarios of a batch of tasks (or their `ScenarioRecord`s), in the order of their completion"""
+        for record in records:
+            self.update_scheduler_scenario(record)
+
     def register_resource_table(self, device):
         if device in self.resource_table:
             return
@@ -74,15 +84,18 @@ class Scheduler:
         resource = info['resource']
         self.resource_table[device] = resource
 
-        for source_id in self.schedule_table:
-            agent = self.schedule_table[source_id]
-            agent.update_resource(device, resource)
+        # agents consume the latest resource of each device at their own pace, without blocking the update
+        for mailbox in list(self.resource_mailboxes.values()):
+            mailbox.post(device, resource)
 
         LOGGER.info(f'[Update Resource] Device {device}: {resource}')
 
     def get_scheduler_resource(self):
         return self.resource_table
 
+    def get_resource_lag(self):
+        return {source_id: mailbox.get_metrics() for source_id, mailbox in list(self.resource_mailboxes.items())}
+
     def get_source_node_selection_plan(self, source_id, data):
         agent = self.schedule_table[source_id]
         plan = agent.get_source_selection_plan(data)
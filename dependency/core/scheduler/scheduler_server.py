@@ -5,8 +5,8 @@ from fastapi.routing import APIRoute
 from starlette.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from core.lib.network import NetworkAPIMethod, NetworkAPIPath
-from core.lib.content import Task
+from core.lib.network import NetworkAPIMethod, NetworkAPIPath, TaskCodecMiddleware
+from core.lib.content import Task, TaskCodec, ScenarioRecord
 from core.lib.common import LOGGER
 
 from .scheduler import Scheduler
@@ -30,6 +30,11 @@ class SchedulerServer:
                      response_class=JSONResponse,
                      methods=[NetworkAPIMethod.SCHEDULER_SCENARIO]
                      ),
+            APIRoute(NetworkAPIPath.SCHEDULER_SCENARIO_BATCH,
+                     self.update_object_scenarios,
+                     response_class=JSONResponse,
+                     methods=[NetworkAPIMethod.SCHEDULER_SCENARIO_BATCH]
+                     ),
             APIRoute(NetworkAPIPath.SCHEDULER_POST_RESOURCE,
                      self.update_resource_state,
                      response_class=JSONResponse,
@@ -40,6 +45,11 @@ class SchedulerServer:
                      response_class=JSONResponse,
                      methods=[NetworkAPIMethod.SCHEDULER_GET_RESOURCE]
                      ),
+            APIRoute(NetworkAPIPath.SCHEDULER_RESOURCE_LAG,
+                     self.get_resource_lag,
+                     response_class=JSONResponse,
+                     methods=[NetworkAPIMethod.SCHEDULER_RESOURCE_LAG]
+                     ),
             APIRoute(NetworkAPIPath.SCHEDULER_SELECT_SOURCE_NODES,
                      self.generate_source_nodes_selection_plan,
                      response_class=JSONResponse,
@@ -55,6 +65,7 @@ class SchedulerServer:
             CORSMiddleware, allow_origins=["*"], allow_credentials=True,
             allow_methods=["*"], allow_headers=["*"],
         )
+        self.app.add_middleware(TaskCodecMiddleware, codecs=TaskCodec.get_supported_codecs())
 
         self.scheduler = Scheduler()
 
@@ -74,6 +85,11 @@ class SchedulerServer:
 
         self.scheduler.update_scheduler_scenario(task)
 
+    async def update_object_scenarios(self, data: str = Form(...)):
+        records = [ScenarioRecord.from_dict(record) for record in TaskCodec.decode_any(data)['records']]
+
+        self.scheduler.update_scheduler_scenarios(records)
+
     async def update_resource_state(self, data: str = Form(...)):
         data = json.loads(data)
 
@@ -83,6 +99,9 @@ class SchedulerServer:
     async def get_resource_state(self):
         return self.scheduler.get_scheduler_resource()
 
+    async def get_resource_lag(self):
+        return self.scheduler.get_resource_lag()
+
     async def generate_source_nodes_selection_plan(self, data: str = Form(...)):
         data = json.loads(data)
 